@@ -1,15 +1,190 @@
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, Session
 
+logger = logging.getLogger(__name__)
+
 DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "amalgamator.db")
-DATABASE_URL = f"sqlite:///{DB_PATH}"
+DATABASE_URL = os.getenv("AMALGAMATOR_DATABASE_URL", f"sqlite:///{DB_PATH}")
+
+# Engine profiles.  Every tuned profile runs SQLite in WAL mode so a fetch
+# run, a delivery run and reporting queries can share the DB without
+# "database is locked" errors; they differ in durability, cache and pool
+# sizing.  WAL is a persistent property of the DB file, so "legacy" does not
+# switch a database back out of it.
+#   pragmas     applied to every new connection
+#   pool_size   connections kept open (delivery workers each hold one)
+_BASE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",  # fsync at checkpoints, not on every commit
+    "busy_timeout": 10000,  # ms to wait for a competing writer
+    "temp_store": "MEMORY",
+    "cache_size": -32000,  # KiB (negative) — 32 MB page cache
+    "mmap_size": 268435456,  # 256 MB memory-mapped I/O
+}
+
+PROFILES = {
+    "default": {"pragmas": _BASE_PRAGMAS, "pool_size": 5},
+    # main.py: fetch and delivery thread pools each hold a connection
+    "worker": {"pragmas": _BASE_PRAGMAS, "pool_size": 10},
+    "report": {
+        "pragmas": {**_BASE_PRAGMAS, "query_only": "ON"},
+        "pool_size": 5,
+    },
+    # db.migrate_csv only: with synchronous=OFF an OS crash or power loss can
+    # corrupt the database file, not just lose the re-runnable import, so
+    # schema migrations, pruning and backfills use "default".
+    "bulk": {
+        "pragmas": {
+            **_BASE_PRAGMAS,
+            "synchronous": "OFF",
+            "cache_size": -256000,
+        },
+        "pool_size": 2,
+    },
+    # Pre-change behaviour: rollback journal, full fsync, no tuning.
+    "legacy": {"pragmas": {}, "pool_size": 5},
+}
+DEFAULT_PROFILE = os.getenv("AMALGAMATOR_DB_PROFILE", "default")
+
+engine: Engine = None
+profile: Optional[str] = None
+SessionLocal = sessionmaker()
+
+
+def _apply_pragmas(pragmas: dict):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    return on_connect
+
+
+def make_engine(profile_name: str = DEFAULT_PROFILE, url: str = DATABASE_URL) -> Engine:
+    """Creates an engine configured with the given profile."""
+    if profile_name not in PROFILES:
+        raise ValueError(
+            f"Unknown DB profile {profile_name!r}; expected one of {sorted(PROFILES)}."
+        )
+    settings = PROFILES[profile_name]
+
+    kwargs = {"echo": False}
+    if url.startswith("sqlite:///") and url != "sqlite:///:memory:":
+        kwargs.update(
+            pool_size=settings["pool_size"],
+            max_overflow=settings["pool_size"],
+            # Connections are handed between worker threads by the pool.
+            connect_args={"check_same_thread": False},
+        )
+
+    new_engine = create_engine(url, **kwargs)
+    if url.startswith("sqlite") and settings["pragmas"]:
+        event.listen(new_engine, "connect", _apply_pragmas(settings["pragmas"]))
+    return new_engine
+
+
+def configure(profile_name: Optional[str] = None, url: str = DATABASE_URL) -> Engine:
+    """
+    (Re)binds the module engine and SessionLocal to a profile.  Entry points
+    call this with their own profile; AMALGAMATOR_DB_PROFILE overrides it.
+    """
+    global engine, profile
+    profile_name = os.getenv("AMALGAMATOR_DB_PROFILE") or profile_name or "default"
+    if engine is not None:
+        engine.dispose()
+    engine = make_engine(profile_name, url)
+    profile = profile_name
+    SessionLocal.configure(bind=engine)
+    logger.debug(f"Database engine configured with the {profile_name!r} profile.")
+    return engine
+
 
-engine = create_engine(DATABASE_URL, echo=False)
-SessionLocal = sessionmaker(bind=engine)
+def get_engine() -> Engine:
+    """Returns the currently configured engine."""
+    return engine
 
 
 def get_session() -> Session:
     """Returns a new database session."""
     return SessionLocal()
+
+
+class StatementStats:
+    """Execution count and time per SQL statement, filled by track_statements()."""
+
+    def __init__(self):
+        self._stats: Dict[str, List[float]] = {}  # sql -> [count, total, max]
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, elapsed: float) -> None:
+        with self._lock:
+            entry = self._stats.setdefault(statement, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+
+    def totals(self) -> Tuple[int, float]:
+        """(statements executed, seconds spent in them)."""
+        with self._lock:
+            return (
+                int(sum(e[0] for e in self._stats.values())),
+                sum(e[1] for e in self._stats.values()),
+            )
+
+    def slowest(self, limit: int = 10) -> List[Tuple[str, int, float, float]]:
+        """(sql, count, total seconds, max seconds), by total time."""
+        with self._lock:
+            rows = [(sql, int(c), t, m) for sql, (c, t, m) in self._stats.items()]
+        return sorted(rows, key=lambda row: row[2], reverse=True)[:limit]
+
+
+@contextmanager
+def track_statements(
+    stats: Optional[StatementStats] = None,
+) -> Iterator[StatementStats]:
+    """
+    Times every statement executed on any engine (including ones created by
+    a later configure()) while the block runs.  An executemany counts once.
+    """
+    stats = stats or StatementStats()
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("statement_started", []).append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["statement_started"].pop()
+        stats.record(statement, time.perf_counter() - started)
+
+    def failed(context):
+        # A failed statement never reaches after_cursor_execute.
+        if context.connection is not None:
+            starts = context.connection.info.get("statement_started")
+            if starts:
+                starts.pop()
+
+    hooks = (
+        ("before_cursor_execute", before),
+        ("after_cursor_execute", after),
+        ("handle_error", failed),
+    )
+    for name, hook in hooks:
+        event.listen(Engine, name, hook)
+    try:
+        yield stats
+    finally:
+        for name, hook in hooks:
+            event.remove(Engine, name, hook)
+
+
+configure(DEFAULT_PROFILE)
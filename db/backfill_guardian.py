@@ -0,0 +1,203 @@
+"""
+Backfills historical Guardian content into the articles table.
+Run:  python -m db.backfill_guardian --from 2024-01-01              # up to today
+      python -m db.backfill_guardian --from 2024-01-01 --to 2024-03-31 --workers 4
+      python -m db.backfill_guardian --from 2024-01-01 --rate 0.5   # requests/second
+
+By default every active Guardian section is backfilled with one OR'd query
+per page (as guardian.fetch_sections does); --section picks others.
+
+The range is split into publication days, fetched in parallel (every page of
+a day at the maximum page size) while one RateLimiter keeps the combined
+request rate under --rate.  Each day is deduplicated and saved as it
+arrives, and recorded in guardian_backfill_days only once saved, so an
+interrupted, rate-limited or failed backfill resumes with the days still
+missing.
+
+Needs GUARDIAN_API_KEY.  Safe to re-run.
+"""
+
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+
+from db import configure, get_session
+from db.migrate_schema import upgrade
+from db.models import GuardianBackfillDay, Source
+from sources import guardian
+from utils.dedup import deduplicate
+from utils.storage import find_existing_hashes, save_articles
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+WORKERS = 4
+RATE = 1.0  # requests per second, across workers (developer keys allow 1/s)
+
+
+def _days(start: date, end: date) -> List[str]:
+    return [
+        (start + timedelta(days=n)).isoformat() for n in range((end - start).days + 1)
+    ]
+
+
+def _fetch_day(api_key: str, section: str, day: str, limiter) -> list:
+    params = {**guardian.DEFAULT_PARAMS, "section": section}
+    return guardian.fetch_range(
+        api_key, f"{day}T00:00:00Z", f"{day}T23:59:59Z", params, limiter
+    )
+
+
+def _record_day(section: str, day: str, articles: int, inserted: int) -> None:
+    session = get_session()
+    try:
+        session.merge(
+            GuardianBackfillDay(
+                section=section, day=day, articles=articles, inserted=inserted
+            )
+        )
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Failed to record backfill of {section} {day}: {e}")
+    finally:
+        session.close()
+
+
+def _active_sections() -> str:
+    """The active Guardian sources' section ids, OR'd as in fetch_sections."""
+    session = get_session()
+    try:
+        sources = session.scalars(
+            select(Source).where(
+                Source.active == True,
+                Source.source_type == "api",
+                Source.url.contains("guardianapis"),
+            )
+        ).all()
+        return "|".join(
+            sorted({guardian.section_id(s.url, s.section) for s in sources})
+        )
+    finally:
+        session.close()
+
+
+def backfill(
+    start: date,
+    end: date,
+    section: Optional[str] = None,
+    workers: int = WORKERS,
+    rate: float = RATE,
+) -> None:
+    """
+    Fetches and saves every day in [start, end] not yet backfilled, for
+    ``section`` (a section id, or several OR'd with "|") or by default every
+    active Guardian section in one query per page.
+    """
+    load_dotenv()
+    api_key = os.getenv("GUARDIAN_API_KEY")
+    if not api_key:
+        logger.error("GUARDIAN_API_KEY not set. Nothing to backfill.")
+        return
+
+    upgrade()
+    section = section or _active_sections()
+    if not section:
+        logger.warning("No active Guardian sources. Nothing to backfill.")
+        return
+
+    session = get_session()
+    try:
+        done = set(
+            session.scalars(
+                select(GuardianBackfillDay.day).where(
+                    GuardianBackfillDay.section == section
+                )
+            )
+        )
+    finally:
+        session.close()
+
+    days = [day for day in _days(start, end) if day not in done]
+    logger.info(
+        f"Backfilling {section}: {len(days)} day(s) to fetch, "
+        f"{len(done)} already done."
+    )
+    if not days:
+        return
+
+    limiter = guardian.RateLimiter(rate)
+    started = time.perf_counter()
+    completed = failed = fetched = inserted = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_fetch_day, api_key, section, day, limiter): day for day in days
+        }
+        for future in as_completed(futures):
+            day = futures[future]
+            try:
+                articles = future.result()
+                new_rows = deduplicate(articles, lookup=find_existing_hashes)
+                added, _ = save_articles(new_rows)
+            except Exception as e:
+                # Only days whose articles were saved are recorded as done.
+                failed += 1
+                logger.error(f"{section} {day}: failed ({e}); left for the next run.")
+                continue
+            _record_day(section, day, len(articles), added)
+
+            completed += 1
+            fetched += len(articles)
+            inserted += added
+            elapsed = time.perf_counter() - started
+            logger.info(
+                f"{section} {day}: {len(articles)} articles, {added} new "
+                f"({completed}/{len(days)} days, {fetched / elapsed:,.0f} articles/s)."
+            )
+
+    logger.info(
+        f"Backfill finished in {time.perf_counter() - started:.1f}s: "
+        f"{completed} day(s), {fetched} articles, {inserted} new, "
+        f"{failed} day(s) failed."
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill Guardian articles.")
+    parser.add_argument(
+        "--from",
+        dest="start",
+        required=True,
+        type=date.fromisoformat,
+        help="first publication day (YYYY-MM-DD)",
+    )
+    parser.add_argument(
+        "--to",
+        dest="end",
+        default=date.today(),
+        type=date.fromisoformat,
+        help="last publication day (default today)",
+    )
+    parser.add_argument(
+        "--section",
+        help="Guardian section id(s), e.g. world|uk-news (default: active sources)",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=WORKERS, help="days fetched in parallel"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=RATE, help="max requests per second"
+    )
+    args = parser.parse_args()
+
+    configure("default")
+    backfill(args.start, args.end, args.section, args.workers, args.rate)
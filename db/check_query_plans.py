@@ -0,0 +1,142 @@
+"""
+Checks that the hot-path queries issued by main.py use indexes.
+Run:  python -m db.check_query_plans             # fresh in-memory DB from db.models + migrations
+      python -m db.check_query_plans --current   # the configured database
+
+Runs EXPLAIN QUERY PLAN on every query the fetch and delivery layers issue,
+and exits non-zero if any of them does a full scan of a table that grows
+with usage (articles, deliveries), or does not use a search that
+REQUIRED_SEARCHES demands of it.  Scans of the small per-user/per-source
+tables in SCAN_ALLOWED are expected — the batched queries read them whole.
+"""
+
+import argparse
+import logging
+import re
+import sys
+from typing import List, Tuple
+
+from sqlalchemy import select
+
+from db import configure, get_engine, make_engine
+from db.migrate_schema import upgrade
+from db.models import Source, SourceHealth, User
+from utils.delivery import (
+    pending_articles_stmt,
+    subscription_signatures_stmt,
+    users_with_exceptions_stmt,
+)
+from utils.polling import due_sources_stmt
+from utils.storage import existing_hashes_stmt, recent_hashes_stmt
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# Tables sized by the number of users or sources, read in full by design.
+SCAN_ALLOWED = {
+    "news_sources",
+    "source_health",
+    "users",
+    "user_subscriptions",
+    "user_watermarks",
+}
+
+SCAN_PATTERN = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+
+# Statements whose plan must contain a specific search.  Watermark-mode
+# pending articles have to be a range above the mark per source, not every
+# article of the source probed against user_deliveries.
+_ABOVE_MARK = re.compile(r"^SEARCH (?:TABLE )?news_articles .*\(source=\? AND id>\?\)")
+REQUIRED_SEARCHES = {
+    "pending articles (watermark)": _ABOVE_MARK,
+    "pending articles (cohort representatives)": _ABOVE_MARK,
+}
+
+
+def hot_path_statements() -> List[Tuple[str, object]]:
+    """(name, statement) for every query main.py runs per fetch / delivery."""
+    sample_hashes = ["0" * 64, "f" * 64]
+    return [
+        ("due sources", due_sources_stmt()),
+        (
+            "source health",
+            select(SourceHealth).where(SourceHealth.source_id.in_([1, 2])),
+        ),
+        ("dedup hash lookup", existing_hashes_stmt(sample_hashes)),
+        ("recent hashes per source", recent_hashes_stmt("BBC News")),
+        ("save fetch state", select(Source).where(Source.id.in_([1, 2]))),
+        ("active users", select(User).where(User.active == True)),
+        ("pending articles (rows)", pending_articles_stmt(mode="rows")),
+        ("pending articles (watermark)", pending_articles_stmt(mode="watermark")),
+        (
+            "pending articles (cohort representatives)",
+            pending_articles_stmt([1, 2], mode="watermark"),
+        ),
+        ("subscription signatures", subscription_signatures_stmt()),
+        ("users with delivery exceptions", users_with_exceptions_stmt()),
+    ]
+
+
+def check(bind) -> bool:
+    """
+    Explains each hot-path statement; returns False on any forbidden scan or
+    missing required search.
+    """
+    ok = True
+    with bind.connect() as conn:
+        for name, stmt in hot_path_statements():
+            sql = str(
+                stmt.compile(
+                    dialect=bind.dialect, compile_kwargs={"literal_binds": True}
+                )
+            )
+            plan = [row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+            scans = []
+            for detail in plan:
+                match = SCAN_PATTERN.match(detail)
+                if match and match.group(1) not in SCAN_ALLOWED:
+                    # Scans of subqueries ("SCAN subscribed") read a
+                    # materialised result, not a table.
+                    if match.group(1) in bind.dialect.get_table_names(conn):
+                        scans.append(detail)
+
+            required = REQUIRED_SEARCHES.get(name)
+            if scans:
+                ok = False
+                logger.error(f"FULL SCAN  {name}: {'; '.join(scans)}")
+            elif required and not any(required.match(d) for d in plan):
+                ok = False
+                logger.error(
+                    f"NO RANGE   {name}: expected {required.pattern!r} in "
+                    f"{'; '.join(plan)}"
+                )
+            else:
+                logger.info(f"ok         {name}")
+            for detail in plan:
+                logger.debug(f"           {detail}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check hot-path query plans.")
+    parser.add_argument(
+        "--current",
+        action="store_true",
+        help="check the configured database instead of a fresh schema",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="print plans")
+    args = parser.parse_args()
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+
+    if args.current:
+        configure("report")
+        bind = get_engine()
+    else:
+        bind = make_engine("default", "sqlite://")
+        upgrade(bind)
+
+    sys.exit(0 if check(bind) else 1)
@@ -1,17 +1,30 @@
 """
 Migrates existing articles from CSV into the articles table.
-Run once:  python -m db.migrate_csv
-
-Safe to re-run — skips articles whose hash already exists in the DB.
+Run:  python -m db.migrate_csv                       # import / resume articles.csv
+      python -m db.migrate_csv --file archive.csv --chunk-size 50000
+      python -m db.migrate_csv --restart             # ignore the checkpoint
+
+The file is streamed in fixed-size chunks, so memory use does not grow with
+its size.  Each chunk goes through utils.storage.insert_articles (INSERT ...
+ON CONFLICT(hash) DO NOTHING) and is committed together with its checkpoint
+(import_checkpoints), so an interrupted import resumes after the last
+committed chunk.  Rows appended
+to the file after a completed import are picked up by the next run.
+
+Safe to re-run — articles whose hash already exists in the DB are skipped.
 """
 
+import argparse
+import csv
 import logging
 import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List
 
-import pandas as pd
-
-from db import engine, get_session
-from db.models import Article, Base
+from db import configure, get_engine, get_session
+from db.models import Base, ImportCheckpoint
+from utils.storage import insert_articles
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s"
@@ -19,55 +32,153 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 CSV_FILE = "articles.csv"
+CHUNK_ROWS = 10000
+
+# The CSV uses the standard article dict keys (see utils.storage).
+CSV_COLUMNS = (
+    "date_added",
+    "lastModified",
+    "source",
+    "sectionName",
+    "headline",
+    "webUrl",
+    "hash",
+)
 
 
-def migrate():
-    """Reads articles.csv and inserts rows into the articles table."""
-    Base.metadata.create_all(engine)
+class _ByteCountingLines:
+    """Iterates a binary file as decoded lines, tracking the bytes consumed."""
 
-    if not os.path.exists(CSV_FILE):
-        logger.warning(f"{CSV_FILE} not found. Nothing to migrate.")
-        return
+    def __init__(self, f, offset: int):
+        self._f = f
+        self.offset = offset
 
-    df = pd.read_csv(CSV_FILE)
-    logger.info(f"Read {len(df)} rows from {CSV_FILE}.")
+    def __iter__(self) -> Iterator[str]:
+        for line in self._f:
+            self.offset += len(line)
+            yield line.decode("utf-8", errors="replace")
 
-    session = get_session()
-    added = 0
-    skipped = 0
 
-    try:
-        existing_hashes = {row.hash for row in session.query(Article.hash).all()}
-
-        for _, row in df.iterrows():
-            h = str(row.get("hash", ""))
-            if h in existing_hashes:
-                skipped += 1
-                continue
-
-            article = Article(
-                date_added=str(row.get("date_added", "")),
-                last_modified=str(row.get("lastModified", "")),
-                source=str(row.get("source", "")),
-                section_name=str(row.get("sectionName", "")),
-                headline=str(row.get("headline", "")),
-                web_url=str(row.get("webUrl", "")),
-                hash=h,
-            )
-            session.add(article)
-            added += 1
+def _article(record: Dict[str, Any]) -> Dict[str, str]:
+    # Empty cells and columns missing from the file are stored as "".
+    return {column: record.get(column) or "" for column in CSV_COLUMNS}
 
+
+def _load_checkpoint(session, path: str, restart: bool) -> ImportCheckpoint:
+    checkpoint = session.get(ImportCheckpoint, path)
+    if checkpoint is not None and (
+        restart or checkpoint.byte_offset > os.path.getsize(path)
+    ):
+        if not restart:
+            logger.warning(f"{path} is smaller than its checkpoint; starting over.")
+        session.delete(checkpoint)
+        session.flush()
+        checkpoint = None
+    if checkpoint is None:
+        checkpoint = ImportCheckpoint(source_file=path)
+        session.add(checkpoint)
         session.commit()
+    return checkpoint
+
+
+def migrate(
+    csv_file: str = CSV_FILE, chunk_size: int = CHUNK_ROWS, restart: bool = False
+) -> None:
+    """Streams ``csv_file`` into the articles table, resuming from its checkpoint."""
+    Base.metadata.create_all(get_engine())
+
+    if not os.path.exists(csv_file):
+        logger.warning(f"{csv_file} not found. Nothing to migrate.")
+        return
+
+    path = os.path.abspath(csv_file)
+    file_size = os.path.getsize(path)
+
+    session = get_session()
+    try:
+        checkpoint = _load_checkpoint(session, path, restart)
+        with open(path, "rb") as f:
+            header = next(csv.reader([f.readline().decode("utf-8-sig")]), [])
+            offset = max(checkpoint.byte_offset, f.tell())
+            if offset >= file_size:
+                logger.info(
+                    f"{csv_file} already imported ({checkpoint.rows_read} rows). "
+                    f"Use --restart to import it again."
+                )
+                return
+            if checkpoint.rows_read:
+                logger.info(
+                    f"Resuming {csv_file} at byte {offset:,} "
+                    f"({checkpoint.rows_read:,} rows already read)."
+                )
+            f.seek(offset)
+            checkpoint.completed_at = None
+
+            lines = _ByteCountingLines(f, offset)
+            records = csv.DictReader(lines, fieldnames=header)
+            started = time.perf_counter()
+            read = 0
+            chunk: List[Dict[str, str]] = []
+
+            def commit_chunk() -> None:
+                inserted = insert_articles(session, chunk, chunk_size)
+                checkpoint.byte_offset = lines.offset
+                checkpoint.rows_read += len(chunk)
+                checkpoint.rows_inserted += inserted
+                checkpoint.rows_skipped += len(chunk) - inserted
+                checkpoint.updated_at = datetime.now(timezone.utc)
+                session.commit()
+
+                elapsed = time.perf_counter() - started
+                logger.info(
+                    f"{checkpoint.rows_read:,} rows "
+                    f"({lines.offset / max(file_size, 1):.1%} of file): "
+                    f"+{inserted} inserted, {len(chunk) - inserted} skipped, "
+                    f"{read / max(elapsed, 1e-9):,.0f} rows/s."
+                )
+
+            for record in records:
+                chunk.append(_article(record))
+                read += 1
+                if len(chunk) >= chunk_size:
+                    commit_chunk()
+                    chunk = []
+
+            checkpoint.completed_at = datetime.now(timezone.utc)
+            commit_chunk()
+
+        elapsed = time.perf_counter() - started
         logger.info(
-            f"Migration complete: {added} added, {skipped} skipped (already exist)."
+            f"Migration complete: {read:,} rows in {elapsed:.1f}s "
+            f"({read / max(elapsed, 1e-9):,.0f} rows/s). Totals for {csv_file}: "
+            f"{checkpoint.rows_inserted:,} added, "
+            f"{checkpoint.rows_skipped:,} skipped (already exist)."
         )
     except Exception as e:
         session.rollback()
-        logger.error(f"Migration failed: {e}")
+        logger.error(f"Migration failed: {e}. Re-run to resume from the checkpoint.")
         raise
     finally:
         session.close()
 
 
 if __name__ == "__main__":
-    migrate()
+    parser = argparse.ArgumentParser(description="Import articles from a CSV file.")
+    parser.add_argument(
+        "--file", default=CSV_FILE, help=f"CSV file to import (default {CSV_FILE})"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=CHUNK_ROWS,
+        help=f"rows per insert and checkpoint (default {CHUNK_ROWS})",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="discard the checkpoint and read the file from the start",
+    )
+    args = parser.parse_args()
+
+    configure("bulk")
+    migrate(csv_file=args.file, chunk_size=args.chunk_size, restart=args.restart)
@@ -0,0 +1,143 @@
+"""
+Brings an existing database in line with db.models.
+Run:  python -m db.migrate_schema            # apply everything outstanding
+      python -m db.migrate_schema --status   # list applied / pending versions
+
+Base.metadata.create_all() only creates missing tables.  An upgrade runs in
+two steps:
+
+1. Columns added to an existing model later on are added with
+   ALTER TABLE ... ADD COLUMN.
+2. Versioned migrations (MIGRATIONS below) handle what create_all cannot do
+   to an existing table, such as adding indexes.  Applied versions are
+   recorded in schema_migrations.
+
+Safe to re-run — only missing columns and unapplied versions are applied.
+"""
+
+import argparse
+import logging
+from datetime import datetime, timezone
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect
+
+from db import configure, get_engine
+from db.models import Article, Base
+
+logger = logging.getLogger(__name__)
+
+
+def _create_model_index(table, name: str) -> Callable:
+    """Migration step creating an index declared in db.models, if missing."""
+
+    def step(conn) -> None:
+        index = next(ix for ix in table.indexes if ix.name == name)
+        index.create(conn, checkfirst=True)
+
+    return step
+
+
+# (version, description, step(conn)) — append only, never renumber.
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (
+        1,
+        "index news_articles (source, id) for pending-article lookups",
+        _create_model_index(Article.__table__, "ix_news_articles_source_id"),
+    ),
+]
+
+
+def _sync_columns(bind) -> int:
+    """Creates missing tables and adds missing nullable columns. Returns columns added."""
+    Base.metadata.create_all(bind)
+    inspector = inspect(bind)
+    added = 0
+
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable:
+                    raise RuntimeError(
+                        f"Cannot add NOT NULL column {table.name}.{column.name} "
+                        f"to an existing table."
+                    )
+                col_type = column.type.compile(dialect=bind.dialect)
+                conn.exec_driver_sql(
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"
+                )
+                logger.info(f"Added column {table.name}.{column.name} ({col_type}).")
+                added += 1
+    return added
+
+
+def _ensure_version_table(conn) -> None:
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        " version INTEGER PRIMARY KEY,"
+        " description TEXT NOT NULL,"
+        " applied_at TEXT NOT NULL)"
+    )
+
+
+def applied_versions(bind=None) -> set:
+    """Returns the migration versions already applied to the database."""
+    bind = bind or get_engine()
+    with bind.begin() as conn:
+        _ensure_version_table(conn)
+        rows = conn.exec_driver_sql("SELECT version FROM schema_migrations")
+        return {version for (version,) in rows}
+
+
+def upgrade(bind=None) -> int:
+    """
+    Adds missing columns, then applies outstanding versioned migrations in
+    order, each in its own transaction.  Returns the number of changes made.
+    """
+    bind = bind or get_engine()
+    changes = _sync_columns(bind)
+    done = applied_versions(bind)
+
+    for version, description, step in MIGRATIONS:
+        if version in done:
+            continue
+        with bind.begin() as conn:
+            step(conn)
+            conn.exec_driver_sql(
+                "INSERT INTO schema_migrations (version, description, applied_at)"
+                " VALUES (?, ?, ?)",
+                (version, description, datetime.now(timezone.utc).isoformat()),
+            )
+        logger.info(f"Applied migration {version}: {description}.")
+        changes += 1
+
+    logger.info(f"Schema up to date ({changes} change(s) applied).")
+    return changes
+
+
+def status(bind=None) -> None:
+    """Logs which migration versions are applied and which are pending."""
+    done = applied_versions(bind)
+    for version, description, _ in MIGRATIONS:
+        state = "applied" if version in done else "pending"
+        logger.info(f"{version:>4}  {state:<8} {description}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s"
+    )
+    parser = argparse.ArgumentParser(description="Upgrade the database schema.")
+    parser.add_argument(
+        "--status", action="store_true", help="list migrations without applying"
+    )
+    args = parser.parse_args()
+
+    configure("default")
+    if args.status:
+        status()
+    else:
+        upgrade()
@@ -0,0 +1,153 @@
+"""
+Moves delivery tracking from per-article user_deliveries rows to per-user
+watermarks (see utils.delivery), and compares the two modes on one DB.
+
+Run:  python -m db.migrate_watermarks            # compute / refresh watermarks
+      python -m db.migrate_watermarks --prune    # ...and drop rows now covered
+      python -m db.migrate_watermarks --compare  # pending sets & timings, both modes
+
+A user's watermark is set just below their oldest still-pending article (and
+never above their newest delivered one), so both modes report exactly the
+same pending set afterwards.  Delivered rows above the mark stay in
+user_deliveries as exceptions.  Safe to re-run.
+
+Once deliveries run in watermark mode they no longer write user_deliveries
+rows, so switching back to rows mode would re-send those articles.
+"""
+
+import argparse
+import logging
+import time
+
+from sqlalchemy import delete, func, select
+
+from db import configure, get_session
+from db.migrate_schema import upgrade
+from db.models import User, UserDelivery, UserWatermark
+from utils.delivery import load_pending_articles, pending_articles_stmt
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def migrate(prune: bool = False) -> None:
+    """Computes a watermark per user from the existing user_deliveries data."""
+    upgrade()
+    session = get_session()
+
+    try:
+        newest_delivered = dict(
+            session.execute(
+                select(
+                    UserDelivery.user_id, func.max(UserDelivery.article_id)
+                ).group_by(UserDelivery.user_id)
+            ).all()
+        )
+
+        pending = pending_articles_stmt(mode="rows").subquery()
+        oldest_pending = dict(
+            session.execute(
+                select(pending.c.user_id, func.min(pending.c.id)).group_by(
+                    pending.c.user_id
+                )
+            ).all()
+        )
+
+        existing = {w.user_id: w for w in session.query(UserWatermark).all()}
+        updated = 0
+        for user_id, newest in newest_delivered.items():
+            mark = newest
+            if user_id in oldest_pending:
+                mark = min(mark, oldest_pending[user_id] - 1)
+
+            if user_id in existing:
+                if existing[user_id].last_article_id != mark:
+                    existing[user_id].last_article_id = mark
+                    updated += 1
+            else:
+                session.add(UserWatermark(user_id=user_id, last_article_id=mark))
+                updated += 1
+        session.commit()
+        logger.info(
+            f"Watermarks: {updated} set/updated for {len(newest_delivered)} user(s)."
+        )
+
+        if prune:
+            pruned = 0
+            for watermark in session.query(UserWatermark).all():
+                pruned += session.execute(
+                    delete(UserDelivery).where(
+                        UserDelivery.user_id == watermark.user_id,
+                        UserDelivery.article_id <= watermark.last_article_id,
+                    )
+                ).rowcount
+            session.commit()
+            logger.info(f"Pruned {pruned} delivery rows covered by watermarks.")
+
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Watermark migration failed: {e}")
+        raise
+    finally:
+        session.close()
+
+
+def compare() -> bool:
+    """
+    Computes every active user's pending set in both modes, logs the timing
+    of each and any users whose sets differ.  Returns True if they match.
+    """
+    session = get_session()
+    try:
+        results = {}
+        for mode in ("rows", "watermark"):
+            started = time.perf_counter()
+            pending = load_pending_articles(session, mode=mode)
+            elapsed = time.perf_counter() - started
+            total = sum(len(articles) for articles in pending.values())
+            logger.info(f"{mode:>9}: {total} pending article(s) in {elapsed:.3f}s.")
+            results[mode] = {
+                user_id: {a["id"] for a in articles}
+                for user_id, articles in pending.items()
+            }
+
+        user_ids = {u.id for u in session.query(User.id).filter(User.active == True)}
+        mismatched = 0
+        for user_id in sorted(user_ids):
+            rows = results["rows"].get(user_id, set())
+            marks = results["watermark"].get(user_id, set())
+            if rows != marks:
+                mismatched += 1
+                logger.warning(
+                    f"User {user_id}: {len(rows - marks)} only in rows mode, "
+                    f"{len(marks - rows)} only in watermark mode."
+                )
+
+        logger.info(f"{mismatched} of {len(user_ids)} active user(s) differ.")
+        return mismatched == 0
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Migrate user_deliveries to per-user delivery watermarks."
+    )
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="delete user_deliveries rows at or below each user's watermark",
+    )
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="only compare the pending sets of both modes",
+    )
+    args = parser.parse_args()
+    configure("default")
+
+    if args.compare:
+        raise SystemExit(0 if compare() else 1)
+    migrate(prune=args.prune)
@@ -4,7 +4,9 @@ from sqlalchemy import (
     Boolean,
     Column,
     DateTime,
+    Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
@@ -28,6 +30,18 @@ class Source(Base):
     date_added = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     active = Column(Boolean, default=True)
 
+    # HTTP validators from the last successful fetch (conditional GET)
+    http_etag = Column(String, nullable=True)
+    http_last_modified = Column(String, nullable=True)
+    content_digest = Column(String(64), nullable=True)  # SHA-256 of the body
+    fetch_cursor = Column(String, nullable=True)  # see sources.http
+
+    # Adaptive polling (utils.polling)
+    poll_interval = Column(Integer, nullable=True)  # seconds
+    publish_rate = Column(Float, nullable=True)  # new articles per hour (EWMA)
+    last_polled_at = Column(DateTime, nullable=True)
+    next_poll_at = Column(DateTime, nullable=True)
+
     subscribers = relationship("UserSubscription", back_populates="source")
 
     def __repr__(self):
@@ -39,6 +53,8 @@ class Article(Base):
     """Represents a fetched news article."""
 
     __tablename__ = "news_articles"
+    # Pending-article queries look up a source's articles above an id
+    __table_args__ = (Index("ix_news_articles_source_id", "source", "id"),)
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     date_added = Column(String, nullable=False)  # ISO 8601 timestamp
@@ -80,6 +96,7 @@ class User(Base):
     delivery_schedule = Column(
         String, nullable=False, default="daily"
     )  # "hourly", "6h", "daily"
+    last_delivered_at = Column(DateTime, nullable=True)  # last digest run (UTC)
     active = Column(Boolean, default=True)
     tier = Column(Integer, nullable=False, default=1)  # 1 = free, 2 = paid
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
@@ -129,6 +146,114 @@ class UserDelivery(Base):
     article = relationship("Article", back_populates="deliveries")
 
 
+class UserWatermark(Base):
+    """
+    Delivery high-water mark for a user (watermark delivery mode).
+    Every article with id <= last_article_id counts as delivered; rows in
+    user_deliveries are then only needed for exceptions above the mark.
+    """
+
+    __tablename__ = "user_watermarks"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    last_article_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(
+        DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
+
+    def __repr__(self):
+        return f"<Watermark user={self.user_id} article<={self.last_article_id}>"
+
+
+class SourceHealth(Base):
+    """
+    Fetch health of a source, updated after every fetch (utils.health).
+    The circuit breaker skips a source while circuit_state is "open" and
+    lets one probe through once retry_at has passed (half-open).
+    """
+
+    __tablename__ = "source_health"
+
+    source_id = Column(Integer, ForeignKey("news_sources.id"), primary_key=True)
+    last_success_at = Column(DateTime, nullable=True)
+    last_failure_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    consecutive_failures = Column(Integer, nullable=False, default=0)
+    fetches = Column(Integer, nullable=False, default=0)
+    failures = Column(Integer, nullable=False, default=0)
+    latency_p50 = Column(Float, nullable=True)  # seconds, over recent_latencies
+    latency_p95 = Column(Float, nullable=True)
+    recent_latencies = Column(Text, nullable=True)  # space-separated, newest last
+    bytes_last = Column(Integer, nullable=True)
+    bytes_total = Column(Integer, nullable=False, default=0)
+    circuit_state = Column(String, nullable=False, default="closed")
+    retry_at = Column(DateTime, nullable=True)  # when an open circuit may probe
+
+    source = relationship("Source")
+
+    def __repr__(self):
+        return (
+            f"<SourceHealth source={self.source_id} {self.circuit_state} "
+            f"failures={self.consecutive_failures}>"
+        )
+
+
+class EmailSendCount(Base):
+    """
+    Emails confirmed by Gmail per UTC day, counted by utils.delivery_pool so
+    the daily sending quota holds across runs and restarts.
+    """
+
+    __tablename__ = "email_send_counts"
+
+    day = Column(String, primary_key=True)  # YYYY-MM-DD (UTC)
+    sent = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<EmailSendCount {self.day}: {self.sent}>"
+
+
+class ImportCheckpoint(Base):
+    """
+    Progress of a CSV import (db.migrate_csv), committed with each chunk so
+    an interrupted import resumes from byte_offset instead of the start.
+    """
+
+    __tablename__ = "import_checkpoints"
+
+    source_file = Column(String, primary_key=True)  # absolute path
+    byte_offset = Column(Integer, nullable=False, default=0)  # next unread row
+    rows_read = Column(Integer, nullable=False, default=0)
+    rows_inserted = Column(Integer, nullable=False, default=0)
+    rows_skipped = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)  # reached end of file
+
+    def __repr__(self):
+        return (
+            f"<ImportCheckpoint {self.source_file} "
+            f"offset={self.byte_offset} rows={self.rows_read}>"
+        )
+
+
+class GuardianBackfillDay(Base):
+    """A day of Guardian content already backfilled (db.backfill_guardian)."""
+
+    __tablename__ = "guardian_backfill_days"
+
+    section = Column(String, primary_key=True)  # section id(s), "|"-separated
+    day = Column(String, primary_key=True)  # YYYY-MM-DD, by publication date
+    articles = Column(Integer, nullable=False, default=0)
+    inserted = Column(Integer, nullable=False, default=0)
+    completed_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<GuardianBackfillDay {self.section} {self.day}: {self.articles}>"
+
+
 class LookupTier(Base):
     """Lookup table defining available tier levels."""
 
@@ -210,8 +210,9 @@ SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name;
 -- FROM news_articles a
 -- JOIN news_sources s ON a.source = s.source_name
 -- JOIN user_subscriptions us ON us.source_id = s.id AND us.user_id = 1
--- WHERE a.id NOT IN (
---     SELECT article_id FROM user_deliveries WHERE user_id = 1
+-- WHERE NOT EXISTS (
+--     SELECT 1 FROM user_deliveries ud
+--     WHERE ud.user_id = us.user_id AND ud.article_id = a.id
 -- )
 -- ORDER BY a.id DESC;
 
@@ -6,8 +6,9 @@ Re-run is safe — skips records that already exist.
 
 import logging
 
-from db import engine, get_session
-from db.models import Base, LookupTier, Source, User, UserSubscription, UserTierChange
+from db import configure, get_session
+from db.migrate_schema import upgrade
+from db.models import LookupTier, Source, User, UserSubscription, UserTierChange
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s"
@@ -61,8 +62,8 @@ SEED_SOURCES = [
 
 
 def seed():
-    """Creates the tables and inserts seed data (skips existing records)."""
-    Base.metadata.create_all(engine)
+    """Creates/upgrades the tables and inserts seed data (skips existing records)."""
+    upgrade()
     session = get_session()
 
     added = 0
@@ -147,4 +148,5 @@ def seed():
 
 
 if __name__ == "__main__":
+    configure("default")
     seed()
@@ -0,0 +1,92 @@
+"""
+Reports fetch health per source (see utils.health).
+Run:  python -m db.source_health             # slowest, flakiest and open circuits
+      python -m db.source_health --limit 20
+
+Slowest is ranked by p95 latency over the recent window, flakiest by the
+share of failed fetches, with consecutive failures as the tie-breaker.
+"""
+
+import argparse
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import select
+
+from db import configure, get_session
+from db.models import Source, SourceHealth
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def _line(source: Source, health: SourceHealth) -> str:
+    p50 = f"{health.latency_p50:.2f}s" if health.latency_p50 is not None else "-"
+    p95 = f"{health.latency_p95:.2f}s" if health.latency_p95 is not None else "-"
+    kib = (health.bytes_last or 0) / 1024
+    return (
+        f"{source.source_name} / {source.section:<20} "
+        f"p50 {p50:>7}  p95 {p95:>7}  "
+        f"failed {health.failures}/{health.fetches} "
+        f"(streak {health.consecutive_failures})  "
+        f"last {kib:.0f} KiB  circuit {health.circuit_state}"
+    )
+
+
+def report(limit: int = 10) -> None:
+    """Logs the slowest and flakiest sources, and any open circuits."""
+    session = get_session()
+    try:
+        rows = session.execute(
+            select(Source, SourceHealth).join(
+                SourceHealth, SourceHealth.source_id == Source.id
+            )
+        ).all()
+        if not rows:
+            logger.info("No fetch health recorded yet.")
+            return
+
+        slowest = sorted(rows, key=lambda r: r[1].latency_p95 or 0, reverse=True)
+        logger.info(f"Slowest sources (by p95 latency, top {limit}):")
+        for source, health in slowest[:limit]:
+            logger.info(f"  {_line(source, health)}")
+
+        flaky = [r for r in rows if r[1].failures]
+        flaky.sort(
+            key=lambda r: (
+                r[1].failures / max(r[1].fetches, 1),
+                r[1].consecutive_failures,
+            ),
+            reverse=True,
+        )
+        logger.info(f"Flakiest sources (by failure rate, top {limit}):")
+        for source, health in flaky[:limit]:
+            logger.info(f"  {_line(source, health)}")
+            logger.info(f"    last error: {health.last_error}")
+        if not flaky:
+            logger.info("  none")
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        open_circuits = [r for r in rows if r[1].circuit_state == "open"]
+        logger.info(f"Open circuits: {len(open_circuits)}")
+        for source, health in open_circuits:
+            probe = "due" if health.retry_at <= now else f"at {health.retry_at:%H:%M}"
+            logger.info(
+                f"  {source.source_name} / {source.section}: "
+                f"probe {probe} UTC, last success {health.last_success_at or 'never'}"
+            )
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report per-source fetch health.")
+    parser.add_argument(
+        "--limit", type=int, default=10, help="sources per list (default 10)"
+    )
+    args = parser.parse_args()
+
+    configure("report")
+    report(limit=args.limit)
@@ -1,193 +1,833 @@
 import os
+import time
+import queue
+import atexit
+import signal
 import logging
-from datetime import datetime
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from contextlib import nullcontext
+from functools import partial
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 from dotenv import load_dotenv
 
-from sources import guardian, rss
-from utils.dedup import deduplicate
-from utils.storage import load_existing_hashes, save_articles
-from utils.email_service import send_email_for_user
-from db import get_session
-from db.models import Article, Source, User, UserDelivery, UserSubscription
-
+from sources import archive, guardian, http, rss
+from utils.dedup import article_hash, deduplicate
+from utils.storage import (
+    find_existing_hashes,
+    load_recent_hashes,
+    save_articles,
+    save_fetch_states,
+)
+from utils.delivery import (
+    USER_ID_BATCH,
+    build_cohorts,
+    record_deliveries,
+    record_delivery_run,
+)
+from utils.scheduler import Scheduler, next_delivery_at
+from utils.profiling import Profiler
+from utils.health import allow_fetch, load_health, save_fetch_health
+from utils.polling import (
+    MIN_POLL_INTERVAL,
+    POLL_FIELDS,
+    due_sources_stmt,
+    next_poll_due,
+    update_poll_state,
+)
+from utils import delivery_pool, fetch_pool, metrics
+from utils.email_service import (
+    build_email_for_user,
+    card_cache,
+    get_gmail_client,
+    render_digest_body,
+)
+from db import configure as configure_db, get_session
+from db.models import Source, User
 
 # --- Configuration & Logging Setup ---
 
 
-def setup_logging(log_dir: str = "logs") -> logging.Logger:
+LOG_DIR = "logs"
+LOG_FILE = "amalgamator.log"
+LOG_MAX_BYTES = 10 * 1024 * 1024  # rotate the log file at 10 MB...
+LOG_BACKUPS = 5  # ...keeping this many old files
+LOG_LEVEL = os.getenv("AMALGAMATOR_LOG_LEVEL", "INFO")  # file
+CONSOLE_LOG_LEVEL = os.getenv("AMALGAMATOR_CONSOLE_LOG_LEVEL", "INFO")
+# Libraries that log every statement / request at DEBUG or INFO.
+QUIET_LOGGERS = ("sqlalchemy", "urllib3", "googleapiclient")
+
+
+class _InProcessQueueHandler(QueueHandler):
     """
-    Sets up logging to both file and console.
+    Enqueues records as they are.  The stock QueueHandler formats each
+    record in the calling thread so it can be pickled; within one process
+    that is unnecessary, and formatting is what we want off the hot path.
     """
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
 
-    log_timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-    log_filename = os.path.join(log_dir, f"amalgamator-{log_timestamp}.log")
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _log_level(value) -> int:
+    level = logging.getLevelName(str(value).upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level {value!r}.")
+    return level
 
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format="%(asctime)s [%(levelname)s] %(message)s",
-        handlers=[
-            logging.FileHandler(log_filename, mode="a"),
-            logging.StreamHandler(),
-        ],
+
+def setup_logging(
+    log_dir: str = LOG_DIR,
+    level: str = LOG_LEVEL,
+    console_level: str = CONSOLE_LOG_LEVEL,
+) -> logging.Logger:
+    """
+    Sets up logging to both a size-rotated file and the console.
+
+    Loggers only put records on a queue; a QueueListener thread formats them
+    and does the (blocking) writes.  Records below both levels are dropped
+    before they are built.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
+
+    file_handler = RotatingFileHandler(
+        os.path.join(log_dir, LOG_FILE),
+        maxBytes=LOG_MAX_BYTES,
+        backupCount=LOG_BACKUPS,
+        encoding="utf-8",
     )
+    file_handler.setLevel(_log_level(level))
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(_log_level(console_level))
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(
+        log_queue, file_handler, console_handler, respect_handler_level=True
+    )
+
+    root = logging.getLogger()
+    root.handlers[:] = [_InProcessQueueHandler(log_queue)]
+    root.setLevel(min(file_handler.level, console_handler.level))
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    listener.start()
+    atexit.register(listener.stop)  # flushes the queue on exit
     return logging.getLogger(__name__)
 
 
 # --- Fetch Layer (shared, source-driven) ---
 
 
-def fetch_all_sources(logger) -> None:
+def _build_fetch_jobs(active_sources, logger) -> list:
     """
-    Fetches articles from every active source, deduplicates against the
-    global articles table, and saves new articles.  This is user-agnostic.
+    Turns active Source rows into fetch jobs for utils.fetch_pool.
+    Everything a job needs is bound up front so it can run after the
+    session is closed.
     """
-    load_dotenv()
-
-    all_articles = []
-    session = get_session()
-
-    try:
-        active_sources = session.query(Source).filter(Source.active == True).all()
-        logger.info(f"Loaded {len(active_sources)} active sources from database.")
+    # RSS parsing stops at the first article already stored for the source.
+    recent_hashes = load_recent_hashes(
+        source.source_name for source in active_sources if source.source_type == "rss"
+    )
 
-        for source in active_sources:
-            if source.source_type == "api" and "guardianapis" in source.url:
-                guardian_key = os.getenv("GUARDIAN_API_KEY")
-                if guardian_key:
-                    all_articles.extend(guardian.fetch(guardian_key))
-                else:
-                    logger.warning("GUARDIAN_API_KEY not set. Skipping Guardian.")
+    jobs = []
+    guardian_sections = []
+    for source in active_sources:
+        name = f"{source.source_name} / {source.section}"
+        state = {
+            field: getattr(source, field) for field in http.STATE_FIELDS + POLL_FIELDS
+        }
+
+        if _is_guardian(source):
+            guardian_sections.append(
+                {
+                    "source_id": source.id,
+                    "name": name,
+                    "url": source.url,
+                    "state": state,
+                    "section_id": guardian.section_id(source.url, source.section),
+                }
+            )
 
-            elif source.source_type == "rss":
-                all_articles.extend(
-                    rss.fetch(
+        elif source.source_type == "rss":
+            jobs.append(
+                {
+                    "source_id": source.id,
+                    "name": name,
+                    "url": source.url,
+                    "state": state,
+                    "fetch": partial(
+                        rss.fetch,
                         feed_url=source.url,
                         source_name=source.source_name,
                         section=source.section,
                         max_items=5,
-                    )
-                )
+                        state=state,
+                        known_hashes=recent_hashes.get(source.source_name),
+                    ),
+                }
+            )
+
+    if guardian_sections:
+        guardian_job = _guardian_job(guardian_sections, logger)
+        if guardian_job:
+            jobs.append(guardian_job)
+    return jobs
+
+
+def _is_guardian(source) -> bool:
+    return source.source_type == "api" and "guardianapis" in source.url
+
+
+def _with_guardian_group(session, sources: list) -> list:
+    """
+    If any Guardian section is due, adds every other active Guardian section:
+    they share one OR'd request (see _guardian_job), so the group is polled
+    together and stays one API call however far its sections' adaptive
+    schedules drift apart.
+    """
+    if not any(_is_guardian(source) for source in sources):
+        return sources
+    due = {source.id for source in sources}
+    guardian_sources = (
+        session.query(Source)
+        .filter(
+            Source.active == True,
+            Source.source_type == "api",
+            Source.url.contains("guardianapis"),
+        )
+        .all()
+    )
+    return sources + [source for source in guardian_sources if source.id not in due]
+
+
+def _guardian_job(members: list, logger) -> dict:
+    """
+    One fetch job for every Guardian section (a single OR'd API request, see
+    guardian.fetch_sections).  Its result is split back into one result per
+    section source by _split_grouped_results.  None without GUARDIAN_API_KEY.
+    """
+    guardian_key = os.getenv("GUARDIAN_API_KEY")
+    if not guardian_key:
+        logger.warning("GUARDIAN_API_KEY not set. Skipping Guardian.")
+        return None
+
+    sections = {}
+    for member in list(members):
+        if member["section_id"] in sections:
+            logger.warning(
+                f"{member['name']}: Guardian section {member['section_id']} "
+                f"already fetched for another source; skipping."
+            )
+            members.remove(member)
+            continue
+        sections[member["section_id"]] = member["state"]
+
+    return {
+        "name": f"The Guardian ({len(sections)} sections)",
+        "url": members[0]["url"],
+        "members": members,
+        "fetch": partial(guardian.fetch_sections, guardian_key, sections),
+    }
+
+
+def _split_grouped_results(jobs: list, results: list) -> tuple:
+    """Replaces each grouped job and its result with one pair per member source."""
+    split_jobs, split_results = [], []
+    for job, result in zip(jobs, results):
+        if "members" not in job:
+            split_jobs.append(job)
+            split_results.append(result)
+            continue
+        by_section = result["articles"] or {}
+        for member in job["members"]:
+            split_jobs.append(member)
+            split_results.append(
+                {
+                    **result,
+                    "name": member["name"],
+                    "articles": by_section.get(member["section_id"], []),
+                }
+            )
+    return split_jobs, split_results
+
+
+def fetch_all_sources(
+    logger, max_workers: int = fetch_pool.MAX_WORKERS, poll_all: bool = False
+) -> None:
+    """
+    Fetches articles from every active source that is due for a poll,
+    deduplicates against the global articles table, and saves new articles.
+    This is user-agnostic.
+
+    Each source's next poll is scheduled from its new-article rate (see
+    utils.polling), except that the Guardian sections are polled as a group
+    whenever one of them is due; pass poll_all=True to fetch every active
+    source anyway.
+    Sources whose circuit breaker is open are skipped either way (see
+    utils.health).
+    Sources are fetched concurrently (see utils.fetch_pool); pass
+    max_workers=1 to fetch them one at a time.  Fetch state (validators,
+    cursors, poll schedule) is only saved once the new articles are, so a
+    failed save leaves every source to be fetched again.
+    """
+    load_dotenv()
+
+    session = get_session()
+
+    try:
+        if poll_all:
+            active_sources = session.query(Source).filter(Source.active == True).all()
+        else:
+            active_sources = session.scalars(due_sources_stmt()).all()
+            active_sources = _with_guardian_group(session, active_sources)
+        logger.info(f"Loaded {len(active_sources)} sources due for polling.")
+
+        health = load_health(session, [source.id for source in active_sources])
+        fetch_states = {}
+        allowed = []
+        for source in active_sources:
+            if allow_fetch(health.get(source.id)):
+                allowed.append(source)
+                continue
+            retry_at = health[source.id].retry_at
+            logger.info(
+                f"{source.source_name} / {source.section}: circuit open, "
+                f"skipped until {retry_at:%Y-%m-%d %H:%M} UTC."
+            )
+            # Not worth polling before the breaker lets a probe through.
+            state = {field: getattr(source, field) for field in POLL_FIELDS}
+            fetch_states[source.id] = {**state, "next_poll_at": retry_at}
+        jobs = _build_fetch_jobs(allowed, logger)
     finally:
         session.close()
 
-    if not all_articles:
-        logger.info("No articles returned from any source.")
-        return
+    started = time.monotonic()
+    http_before = http.host_stats()
+    results = fetch_pool.run_fetch_jobs(jobs, max_workers=max_workers)
+    jobs, results = _split_grouped_results(jobs, results)
+    for job, result in zip(jobs, results):
+        if result["timed_out"]:
+            # The abandoned fetch may still be running and writing validators
+            # or a cursor for articles that were thrown away; keep only the
+            # polling schedule so the next run fetches the source afresh.
+            job["state"] = {field: job["state"].get(field) for field in POLL_FIELDS}
 
-    # --- Deduplicate & save globally ---
-    existing_hashes = load_existing_hashes()
-    new_rows = deduplicate(all_articles, existing_hashes)
+    all_articles = []
+    for job, result in zip(jobs, results):
+        elapsed = result["elapsed"]
+        timing = f"{elapsed:.2f}s" if elapsed is not None else "not started"
+        if elapsed is not None:
+            metrics.FETCH_SECONDS.observe(elapsed, source=result["name"])
+        metrics.FETCH_BYTES.inc(job["state"].get("bytes") or 0, source=result["name"])
+        metrics.ARTICLES_PARSED.inc(len(result["articles"]), source=result["name"])
+
+        if result["error"] or job["state"].get("error"):
+            error = result["error"] or job["state"]["error"]
+            metrics.FETCH_ERRORS.inc(source=result["name"])
+            logger.warning(f"{result['name']}: failed after {timing}: {error}")
+        elif job["state"].get("not_modified"):
+            logger.info(f"{result['name']}: not modified ({timing}).")
+        else:
+            logger.info(
+                f"{result['name']}: {len(result['articles'])} articles in {timing}."
+            )
+        all_articles.extend(result["articles"])
+
+    logger.info(
+        f"Fetched {len(all_articles)} articles from {len(jobs)} sources "
+        f"in {time.monotonic() - started:.2f}s."
+    )
+    http.log_host_stats(since=http_before)
+
+    # --- Deduplicate globally, crediting each new article to its source ---
+    seen_hashes = find_existing_hashes({article_hash(a) for a in all_articles})
+    new_rows = []
+    outcomes = []
+    for job, result in zip(jobs, results):
+        source_rows = deduplicate(result["articles"], seen_hashes=seen_hashes)
+        new_rows.extend(source_rows)
+
+        # Sources log and swallow their own errors, recording them in state.
+        error = result["error"] or job["state"].get("error")
+        update_poll_state(job["state"], len(source_rows), failed=bool(error))
+        fetch_states[job["source_id"]] = job["state"]
+        if result["elapsed"] is not None or error:
+            outcomes.append(
+                {
+                    "source_id": job["source_id"],
+                    "error": error,
+                    "elapsed": result["elapsed"],
+                    "bytes": job["state"].get("bytes"),
+                }
+            )
+    save_fetch_health(outcomes)
 
     if new_rows:
-        save_articles(new_rows)
-    else:
+        try:
+            save_articles(new_rows)
+        except Exception:
+            # Cursors and validators already cover these articles; saving
+            # them would stop the next run from fetching the articles again.
+            logger.error("Fetch state left unchanged so the articles are refetched.")
+            return
+    elif all_articles:
         logger.info("No new articles found after deduplication.")
+    else:
+        logger.info("No articles returned from any source.")
+    save_fetch_states(fetch_states)
 
 
 # --- Delivery Layer (per-user) ---
 
 
-def deliver_to_users(logger) -> None:
+def _record_job(session, job: dict) -> None:
     """
-    For each active user, finds articles from their subscribed sources
-    that haven't been delivered yet, sends an email, and records the delivery.
+    Records the deliveries of one confirmed email and stamps the user's
+    digest run (worker's session).
+    """
+    record_deliveries(session, job["user_id"], job["article_ids"])
+    record_delivery_run(session, [job["user_id"]])
+
+
+def deliver_to_users(
+    logger, workers: int = delivery_pool.WORKERS, user_ids: list = None
+) -> dict:
+    """
+    For each active user (or each of ``user_ids``), finds articles from their
+    subscribed sources that haven't been delivered yet, sends an email, and
+    records the delivery.  last_delivered_at, which the daemon schedules each
+    user's next digest from, is stamped with the deliveries of a confirmed
+    email, and afterwards for users who had nothing pending; users whose
+    send failed or was skipped for quota stay due.
+
+    Returns {"undelivered": [user_id, ...], "quota_exhausted": bool}: the
+    users whose email was not confirmed, and whether the daily quota ran
+    out, so the daemon can schedule their retry.
+
+    Users who would get an identical digest are grouped into cohorts (see
+    utils.delivery.build_cohorts) so the pending list and HTML body are
+    computed once per cohort.
+
+    Emails are sent by a pool of ``workers`` threads through the shared Gmail
+    client, rate-limited to Gmail's quotas (see utils.delivery_pool);
+    deliveries are only recorded once Gmail has confirmed the message.
     """
     EMAIL_SENDER = "datacollectionstorage@gmail.com"
     session = get_session()
 
     try:
-        active_users = session.query(User).filter(User.active == True).all()
+        query = session.query(User).filter(User.active == True)
+        if user_ids is None:
+            active_users = query.all()
+        else:
+            user_ids = list(user_ids)
+            active_users = [
+                user
+                for start in range(0, len(user_ids), USER_ID_BATCH)
+                for user in query.filter(
+                    User.id.in_(user_ids[start : start + USER_ID_BATCH])
+                )
+            ]
         logger.info(f"Processing deliveries for {len(active_users)} active user(s).")
 
-        for user in active_users:
-            # Get this user's subscribed source names
-            subscribed_source_ids = {
-                sub.source_id
-                for sub in session.query(UserSubscription)
-                .filter(UserSubscription.user_id == user.id)
-                .all()
-            }
-
-            if not subscribed_source_ids:
-                logger.info(f"User {user.email} has no subscriptions. Skipping.")
-                continue
+        cohorts = build_cohorts(session, active_users, user_ids=user_ids)
+        idle_user_ids = [
+            user.id
+            for cohort in cohorts
+            if not cohort["articles"]
+            for user in cohort["users"]
+        ]
+
+        def jobs():
+            for cohort in cohorts:
+                pending_articles = cohort["articles"]
+                for user in cohort["users"]:
+                    metrics.PENDING_ARTICLES.observe(len(pending_articles))
+                # One record per cohort rather than per user.
+                if not pending_articles:
+                    logger.debug(
+                        "No new articles for a cohort of %d user(s).",
+                        len(cohort["users"]),
+                    )
+                    continue
 
-            # Get source names for subscribed IDs
-            subscribed_sources = (
-                session.query(Source).filter(Source.id.in_(subscribed_source_ids)).all()
-            )
-            source_names = {s.source_name for s in subscribed_sources}
-
-            # Get article IDs already delivered to this user
-            delivered_article_ids = {
-                row.article_id
-                for row in session.query(UserDelivery.article_id)
-                .filter(UserDelivery.user_id == user.id)
-                .all()
-            }
-
-            # Find undelivered articles from subscribed sources
-            query = session.query(Article).filter(
-                Article.source.in_(source_names),
-            )
-            if delivered_article_ids:
-                query = query.filter(Article.id.notin_(delivered_article_ids))
+                # Rendered once per cohort; only the greeting differs per user.
+                body_html = render_digest_body(pending_articles, cohort["timezone"])
+                article_ids = [a["id"] for a in pending_articles]
 
-            pending_articles = query.order_by(Article.id.desc()).all()
+                logger.debug(
+                    "Delivering %d article(s) to a cohort of %d user(s).",
+                    len(pending_articles),
+                    len(cohort["users"]),
+                )
+                for user in cohort["users"]:
+                    yield {
+                        "user_id": user.id,
+                        "email": user.email,
+                        "article_ids": article_ids,
+                        "message": build_email_for_user(
+                            articles=pending_articles,
+                            sender=EMAIL_SENDER,
+                            recipient=user.email,
+                            user_name=f"{user.first_name} {user.last_name}".strip(),
+                            user_timezone=user.timezone,
+                            body_html=body_html,
+                        ),
+                    }
+
+        confirmed = []
+
+        def record(worker_session, job: dict) -> None:
+            _record_job(worker_session, job)
+            confirmed.append(job["user_id"])
+
+        counts = delivery_pool.run_delivery_jobs(
+            jobs(),
+            send_batch=get_gmail_client().send_batch,
+            record=record,
+            workers=workers,
+        )
+        logger.info(f"Rendered-card cache: {card_cache.stats()}")
+
+        record_delivery_run(session, idle_user_ids)
+        session.commit()
+
+        done = set(confirmed) | set(idle_user_ids)
+        return {
+            "undelivered": [user.id for user in active_users if user.id not in done],
+            "quota_exhausted": counts["skipped"] > 0,
+        }
 
-            if not pending_articles:
-                logger.info(f"No new articles for {user.email}.")
-                continue
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Delivery failed: {e}")
+        raise
+    finally:
+        session.close()
 
-            # Convert to dicts for the email renderer
-            article_dicts = [a.to_dict() for a in pending_articles]
 
-            logger.info(f"Delivering {len(article_dicts)} articles to {user.email}.")
+# --- Daemon ---
 
-            # Send email
-            send_email_for_user(
-                articles=article_dicts,
-                sender=EMAIL_SENDER,
-                recipient=user.email,
-                user_name=f"{user.first_name} {user.last_name}".strip(),
-                user_timezone=user.timezone,
-            )
 
-            # Record deliveries
-            for article in pending_articles:
-                session.add(UserDelivery(user_id=user.id, article_id=article.id))
-            session.commit()
-            logger.info(
-                f"Recorded {len(pending_articles)} deliveries for {user.email}."
-            )
+FETCH_INTERVAL = 900  # longest gap between fetch cycles in daemon mode (seconds)
+DELIVERY_RETRY = timedelta(minutes=5)  # first retry of an undelivered digest...
+DELIVERY_RETRY_MAX = timedelta(hours=6)  # ...doubled per failure up to this
 
-    except Exception as e:
-        session.rollback()
-        logger.error(f"Delivery failed: {e}")
-        raise
+
+def _delivery_retry_at(failures: int, quota_exhausted: bool, now: datetime) -> datetime:
+    """
+    When to retry a user whose digest has not been confirmed ``failures``
+    times in a row: with exponential backoff, or at the next UTC day once
+    the daily sending quota is used up.
+    """
+    if quota_exhausted:
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return midnight + timedelta(days=1)
+    return now + min(DELIVERY_RETRY * 2 ** min(failures - 1, 10), DELIVERY_RETRY_MAX)
+
+
+def _sync_delivery_schedule(scheduler: Scheduler, held: dict = None) -> None:
+    """
+    (Re)schedules a ("deliver", user_id) entry for every active user from
+    their delivery_schedule and last_delivered_at, and drops users who have
+    been deactivated.  Picks up new users and schedule changes.  Users in
+    ``held`` ({user_id: retry_at}) are not scheduled before their retry.
+    """
+    held = held or {}
+    session = get_session()
+    try:
+        rows = (
+            session.query(User.id, User.delivery_schedule, User.last_delivered_at)
+            .filter(User.active == True)
+            .all()
+        )
     finally:
         session.close()
 
+    active = set()
+    for user_id, schedule, last_delivered_at in rows:
+        key = ("deliver", user_id)
+        active.add(key)
+        due_at = next_delivery_at(schedule, last_delivered_at)
+        if user_id in held:
+            due_at = max(due_at, held[user_id])
+        scheduler.schedule(key, due_at)
+    for key in scheduler.keys():
+        if key != "fetch" and key not in active:
+            scheduler.cancel(key)
+
+
+def _next_fetch_at(started: datetime, fetch_interval: float) -> datetime:
+    """
+    The next fetch cycle: when the earliest source is due for its next poll,
+    but no later than ``fetch_interval`` after the last cycle started and no
+    sooner than MIN_POLL_INTERVAL from now.
+    """
+    next_fetch = started + timedelta(seconds=fetch_interval)
+    session = get_session()
+    try:
+        earliest = next_poll_due(session)
+    finally:
+        session.close()
+    if earliest is not None and earliest < next_fetch:
+        floor = datetime.now(timezone.utc) + timedelta(seconds=MIN_POLL_INTERVAL)
+        next_fetch = max(earliest, min(floor, next_fetch))
+    return next_fetch
+
+
+def run_daemon(
+    logger,
+    fetch_interval: float = FETCH_INTERVAL,
+    metrics_file: str = None,
+    metrics_port: int = None,
+) -> None:
+    """
+    Stays resident: fetches whenever a source is due for a poll (at least
+    every ``fetch_interval`` seconds) and emails each user when their
+    delivery_schedule says a digest is due.  Users due at the
+    same moment are delivered in one run, so they still share cohorts.
+    Stops cleanly on SIGINT / SIGTERM between cycles.
+
+    Users whose digest was not confirmed (a failed send, the quota, or a
+    delivery run that raised) are retried with exponential backoff from
+    DELIVERY_RETRY, or at the next UTC day once the quota is used up.
+
+    Metrics are served on ``metrics_port`` and/or rewritten to
+    ``metrics_file`` after every cycle (see utils.metrics).
+    """
+    if metrics_port is not None:
+        metrics.serve(metrics_port)
+
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        logger.info(f"Received signal {signum}; stopping after the current cycle.")
+        stop.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    scheduler = Scheduler()
+    failures = {}  # user_id -> undelivered runs in a row
+    held = {}  # user_id -> retry time, overriding their delivery_schedule
+    scheduler.schedule("fetch", datetime.now(timezone.utc))
+    _sync_delivery_schedule(scheduler)
+    logger.info(
+        f"Daemon started: fetching at least every {fetch_interval:.0f}s, "
+        f"{len(scheduler) - 1} user(s) scheduled."
+    )
+
+    while not stop.is_set():
+        due = scheduler.pop_due(datetime.now(timezone.utc))
+
+        if "fetch" in due:
+            due.remove("fetch")
+            started = datetime.now(timezone.utc)
+            try:
+                with metrics.STAGE_SECONDS.time(stage="fetch"):
+                    fetch_all_sources(logger)
+            except Exception as e:
+                logger.error(f"Fetch cycle failed: {e}")
+            scheduler.schedule("fetch", _next_fetch_at(started, fetch_interval))
+            _sync_delivery_schedule(scheduler, held)
+            # Users that became due while fetching ride along in this cycle.
+            due.extend(scheduler.pop_due(datetime.now(timezone.utc)))
+
+        user_ids = list(dict.fromkeys(key[1] for key in due))
+        if user_ids and not stop.is_set():
+            try:
+                with metrics.STAGE_SECONDS.time(stage="deliver"):
+                    outcome = deliver_to_users(logger, user_ids=user_ids)
+            except Exception as e:
+                logger.error(f"Delivery to {len(user_ids)} user(s) failed: {e}")
+                outcome = {"undelivered": user_ids, "quota_exhausted": False}
+
+            now = datetime.now(timezone.utc)
+            undelivered = set(outcome["undelivered"])
+            for user_id in user_ids:
+                if user_id in undelivered:
+                    failures[user_id] = failures.get(user_id, 0) + 1
+                    held[user_id] = _delivery_retry_at(
+                        failures[user_id], outcome["quota_exhausted"], now
+                    )
+                else:
+                    failures.pop(user_id, None)
+                    held.pop(user_id, None)
+            if undelivered:
+                retry_at = min(held[user_id] for user_id in undelivered)
+                logger.warning(
+                    f"{len(undelivered)} user(s) not delivered; next retry at "
+                    f"{retry_at:%Y-%m-%d %H:%M} UTC."
+                )
+            _sync_delivery_schedule(scheduler, held)
+
+        if metrics_file:
+            metrics.write_textfile(metrics_file)
+
+        next_due = scheduler.next_due()
+        wait = (next_due - datetime.now(timezone.utc)).total_seconds()
+        if wait > 0:
+            logger.debug(f"Next work due at {next_due.isoformat()}.")
+            stop.wait(wait)
+
+    logger.info("Daemon stopped.")
+
 
 # --- Main Orchestrator ---
 
 
+def replay_archive(logger, directory: str) -> None:
+    """
+    Feeds the responses in a sources.archive directory through parsing,
+    dedup and storage with no network: fetch runs over every active source
+    repeat until the archive is used up.  Point AMALGAMATOR_DATABASE_URL at
+    a scratch database to keep the replay out of the real one.
+    """
+    replay = archive.ReplayArchive(directory)
+    http.set_replay(replay)
+    started = time.monotonic()
+    runs = 0
+    try:
+        while replay.pending():
+            served = replay.served
+            runs += 1
+            logger.info(f"=== Replay run {runs}: {replay.pending()} responses left ===")
+            fetch_all_sources(logger, poll_all=True)
+            if replay.served == served:
+                # e.g. sources inactive or behind an open circuit breaker
+                logger.warning(
+                    f"{replay.pending()} archived responses match no fetchable source."
+                )
+                break
+    finally:
+        http.set_replay(None)
+
+    elapsed = time.monotonic() - started
+    parsed = metrics.ARTICLES_PARSED.total()
+    logger.info(
+        f"Replayed {replay.served} responses in {runs} run(s) in {elapsed:.2f}s: "
+        f"{parsed:.0f} articles parsed ({parsed / max(elapsed, 1e-9):,.0f}/s), "
+        f"{metrics.DB_INSERTED.total():.0f} inserted."
+    )
+
+
 def main():
     """
     Main entry point.
     Step 1: Fetch articles from all active sources (shared).
     Step 2: Deliver new articles to each subscribed user (per-user).
+
+    With --daemon, stays resident and repeats both steps on their own
+    schedules instead (see run_daemon).  With --replay, only fetches, from
+    a response archive (see replay_archive).
     """
-    logger = setup_logging()
+    parser = argparse.ArgumentParser(description="Fetch news and email digests.")
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="stay resident and deliver on each user's delivery_schedule",
+    )
+    parser.add_argument(
+        "--fetch-interval",
+        type=float,
+        default=FETCH_INTERVAL,
+        help=f"longest gap between fetches in daemon mode (default {FETCH_INTERVAL})",
+    )
+    parser.add_argument(
+        "--poll-all",
+        action="store_true",
+        help="fetch every active source, even those not yet due for a poll",
+    )
+    parser.add_argument(
+        "--archive",
+        metavar="DIR",
+        help="record every raw source response into this archive directory",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="DIR",
+        help="fetch from an archive instead of the network, repeating fetch "
+        "runs until it is used up; nothing is delivered",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="profile each stage (cProfile, stack samples, memory, SQL) into "
+        "--profile-dir",
+    )
+    parser.add_argument(
+        "--profile-dir", help="where --profile writes (default profiles/<timestamp>)"
+    )
+    parser.add_argument(
+        "--log-level",
+        default=LOG_LEVEL,
+        help=f"log file level (default {LOG_LEVEL}; AMALGAMATOR_LOG_LEVEL)",
+    )
+    parser.add_argument(
+        "--console-level",
+        default=CONSOLE_LOG_LEVEL,
+        help=f"console log level (default {CONSOLE_LOG_LEVEL}; "
+        "AMALGAMATOR_CONSOLE_LOG_LEVEL)",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        help="write Prometheus-format metrics to this file (after each daemon "
+        "cycle, or at the end of a run)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics (daemon)",
+    )
+    args = parser.parse_args()
+    if args.profile and args.daemon:
+        parser.error("--profile applies to one-shot runs, not --daemon")
+    if args.replay and (args.daemon or args.archive):
+        parser.error("--replay cannot be combined with --daemon or --archive")
+
+    logger = setup_logging(level=args.log_level, console_level=args.console_level)
+    configure_db("worker")
+    if args.archive:
+        http.set_archive(archive.ResponseArchive(args.archive))
+
+    if args.daemon:
+        run_daemon(
+            logger,
+            fetch_interval=args.fetch_interval,
+            metrics_file=args.metrics_file,
+            metrics_port=args.metrics_port,
+        )
+        return
+
+    profiler = Profiler(args.profile_dir) if args.profile else None
+
+    def stage(name: str):
+        return profiler.stage(name) if profiler else nullcontext()
+
+    if args.replay:
+        with metrics.STAGE_SECONDS.time(stage="fetch"), stage("fetch"):
+            replay_archive(logger, args.replay)
+    else:
+        logger.info("=== STEP 1: Fetching articles ===")
+        with metrics.STAGE_SECONDS.time(stage="fetch"), stage("fetch"):
+            fetch_all_sources(logger, poll_all=args.poll_all)
+
+        logger.info("=== STEP 2: Delivering to users ===")
+        with metrics.STAGE_SECONDS.time(stage="deliver"), stage("deliver"):
+            deliver_to_users(logger)
 
-    logger.info("=== STEP 1: Fetching articles ===")
-    fetch_all_sources(logger)
+    if profiler:
+        profiler.report()
 
-    logger.info("=== STEP 2: Delivering to users ===")
-    deliver_to_users(logger)
+    metrics.log_summary(os.path.join(LOG_DIR, "metrics.json"))
+    if args.metrics_file:
+        metrics.write_textfile(args.metrics_file)
 
     logger.info("Process completed.")
 
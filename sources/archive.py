@@ -0,0 +1,154 @@
+"""
+On-disk archive of raw source responses, and offline replay of it.
+
+While a ResponseArchive is installed (http.set_archive), every response
+sources.http.get() receives is recorded:
+
+    <dir>/objects/ab/abcdef....gz   the decoded body, gzip-compressed and
+                                    named by its SHA-256, so an unchanged
+                                    feed is stored once however often it
+                                    is fetched
+    <dir>/index/YYYY-MM-DD.jsonl    one line per response: fetch time,
+                                    source, URL, query parameters (minus the
+                                    API key), status, validator headers and
+                                    the body's SHA-256
+
+A ReplayArchive (http.set_replay) serves those responses back instead of
+the network.  Responses are keyed by source and URL and handed out in fetch
+order, one per request, so each fetch run consumes the next recorded
+response of every source; once a source's responses are used up it
+answers 304 Not Modified.  ``python main.py --replay DIR`` repeats fetch
+runs until the archive is exhausted.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = "archive"
+RECORDED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+REDACTED_PARAMS = ("api-key",)
+
+
+def _key(source: str, url: str) -> str:
+    return f"{source}|{url}"
+
+
+def _object_path(directory: str, digest: str) -> str:
+    return os.path.join(directory, "objects", digest[:2], f"{digest}.gz")
+
+
+class ResponseArchive:
+    """Records responses into a content-addressed, compressed archive."""
+
+    def __init__(self, directory: str = ARCHIVE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "index"), exist_ok=True)
+
+    def _store(self, body: bytes) -> str:
+        digest = hashlib.sha256(body).hexdigest()
+        path = _object_path(self.directory, digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(gzip.compress(body))
+            os.replace(tmp_path, path)
+        return digest
+
+    def record(
+        self,
+        source: str,
+        url: str,
+        params: Optional[Dict[str, Any]],
+        response: requests.Response,
+    ) -> None:
+        """Archives one response (its body must already have been read)."""
+        now = datetime.now(timezone.utc)
+        entry = {
+            "fetched_at": now.isoformat(),
+            "source": source,
+            "url": url,
+            "params": {
+                name: value
+                for name, value in (params or {}).items()
+                if name not in REDACTED_PARAMS
+            },
+            "status": response.status_code,
+            "headers": {
+                name: response.headers[name]
+                for name in RECORDED_HEADERS
+                if name in response.headers
+            },
+            "sha256": self._store(response.content) if response.content else None,
+        }
+        index = os.path.join(self.directory, "index", f"{now:%Y-%m-%d}.jsonl")
+        with self._lock, open(index, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+class ReplayArchive:
+    """Serves archived responses back in fetch order, one per request."""
+
+    def __init__(self, directory: str = ARCHIVE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._queues: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        self.served = 0
+
+        index_dir = os.path.join(directory, "index")
+        if not os.path.isdir(index_dir):
+            raise FileNotFoundError(f"no archive index in {directory}")
+        entries: List[Dict[str, Any]] = []
+        for name in sorted(os.listdir(index_dir)):
+            with open(os.path.join(index_dir, name)) as f:
+                entries.extend(json.loads(line) for line in f if line.strip())
+        entries.sort(key=lambda entry: entry["fetched_at"])
+        for entry in entries:
+            self._queues[_key(entry["source"], entry["url"])].append(entry)
+        logger.info(
+            f"Replaying {len(entries)} archived responses "
+            f"from {len(self._queues)} source URL(s) in {directory}."
+        )
+
+    def pending(self) -> int:
+        """Responses not yet replayed."""
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def response(self, source: str, url: str) -> requests.Response:
+        """The next archived response for ``source`` at ``url``."""
+        with self._lock:
+            queue = self._queues.get(_key(source, url))
+            entry = queue.popleft() if queue else None
+            if entry is not None:
+                self.served += 1
+
+        response = requests.Response()
+        response.url = url
+        if entry is None:
+            response.status_code = 304  # nothing (more) archived for it
+            response._content = b""
+            return response
+
+        response.status_code = entry["status"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response._content = b""
+        if entry["sha256"]:
+            with open(_object_path(self.directory, entry["sha256"]), "rb") as f:
+                response._content = gzip.decompress(f.read())
+        return response
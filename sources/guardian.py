@@ -1,11 +1,42 @@
+"""
+Guardian Content API source.
+
+fetch() is incremental: once a source has a cursor (the newest lastModified
+seen, kept in its fetch state) it asks only for content modified since then,
+oldest first at the maximum page size, and pages through the results until
+it has caught up (or MAX_PAGES, after which the next run carries on from the
+advanced cursor).  Without a cursor it takes the newest DEFAULT_PARAMS
+page-size items, as before.
+
+fetch_sections() does the same for several sections at once with a single
+OR'd section=world|uk-news query, splitting the results back per section by
+their sectionId, so the number of API calls does not grow with sections.
+
+fetch_range() pages through a fixed publication-date window for historical
+backfills (db.backfill_guardian); a shared RateLimiter spaces out requests
+from parallel workers and 429 responses are retried after Retry-After.
+"""
+
 import logging
-from typing import List, Dict, Any
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
 
 import requests
 
+from sources import http
+
 logger = logging.getLogger(__name__)
 
 API_URL = "https://content.guardianapis.com/search"
+REQUEST_TIMEOUT = 10  # seconds
+
+MAX_PAGE_SIZE = 200  # the Content API's upper limit
+MAX_PAGES = 10  # per incremental fetch
+RATE_LIMIT_RETRIES = 3  # retries of a 429 response (fetch_range)
+RETRY_BACKOFF = 2.0  # seconds, doubled per retry when there is no Retry-After
+MAX_RETRY_WAIT = 60.0  # seconds
 
 DEFAULT_PARAMS = {
     "format": "json",
@@ -18,30 +49,37 @@ DEFAULT_PARAMS = {
 }
 
 
-def fetch(api_key: str, params: Dict[str, Any] = None) -> List[Dict[str, Any]]:
-    """
-    Fetches articles from the Guardian API and returns them in a
-    standardised format.
-    """
-    if not api_key:
-        logger.error("Guardian API Key is missing.")
-        raise ValueError("GUARDIAN_API_KEY not found in environment variables.")
+class RateLimiter:
+    """Spaces calls to wait() at least 1/rate seconds apart, across threads."""
 
-    request_params = (params or DEFAULT_PARAMS).copy()
-    request_params["api-key"] = api_key
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
 
-    logger.debug(f"Requesting Guardian API with params: {params or DEFAULT_PARAMS}")
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
 
-    try:
-        response = requests.get(API_URL, params=request_params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        raw_articles = data.get("response", {}).get("results", [])
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Guardian API request failed: {e}")
-        return []
 
-    # Normalise to standard article format
+def section_id(url: str, section: str) -> str:
+    """
+    The Content API section id of a Guardian source: the section= parameter
+    of its URL if it has one, otherwise its section label as a slug
+    ("World" -> "world", "UK News" -> "uk-news").
+    """
+    from_url = parse_qs(urlparse(url).query).get("section")
+    if from_url:
+        return from_url[0]
+    return "-".join(section.lower().split())
+
+
+def _normalise(raw_articles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Maps Content API results onto the standard article format."""
     articles = []
     for article in raw_articles:
         fields = article.get("fields", {})
@@ -54,6 +92,211 @@ def fetch(api_key: str, params: Dict[str, Any] = None) -> List[Dict[str, Any]]:
                 "webUrl": article.get("webUrl", ""),
             }
         )
+    return articles
+
+
+def _get(
+    params: Dict[str, Any],
+    headers: Optional[Dict[str, str]] = None,
+    limiter: Optional[RateLimiter] = None,
+    retries: int = 0,
+) -> requests.Response:
+    """
+    GETs one page of search results.  A 429 is retried up to ``retries``
+    times, after Retry-After or an exponential backoff; other errors raise.
+    """
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.wait()
+        response = http.get(
+            API_URL,
+            params=params,
+            headers=headers,
+            timeout=REQUEST_TIMEOUT,
+            source="The Guardian",
+        )
+        if response.status_code == 429 and attempt < retries:
+            retry_after = response.headers.get("Retry-After", "")
+            wait = (
+                float(retry_after)
+                if retry_after.isdigit()
+                else RETRY_BACKOFF * 2**attempt
+            )
+            logger.warning(f"Guardian: rate limited, retrying in {wait:.0f}s.")
+            time.sleep(min(wait, MAX_RETRY_WAIT))
+            continue
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+
+
+def _page(response: requests.Response) -> Tuple[List[Dict[str, Any]], int]:
+    """(results, total pages) of a search response."""
+    body = response.json().get("response", {})
+    return body.get("results", []), body.get("pages", 1)
+
+
+def _fetch_results(
+    api_key: str, params: Dict[str, Any], state: Optional[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    Raw search results for ``params``, incremental from state["fetch_cursor"]
+    when there is one (see fetch).  Returns [] on failure or when unchanged.
+    """
+    request_params = params.copy()
+    cursor = state.get("fetch_cursor") if state else None
+    if cursor:
+        request_params.update(
+            {
+                "from-date": cursor,
+                "use-date": "last-modified",
+                "order-date": "last-modified",
+                "order-by": "oldest",
+                "page-size": MAX_PAGE_SIZE,
+            }
+        )
+
+    logger.debug(f"Requesting Guardian API with params: {request_params}")
+    request_params["api-key"] = api_key
 
+    try:
+        response = _get(request_params, headers=http.conditional_headers(state))
+        if http.apply_validators(state, response):
+            logger.info("Guardian: response not modified, skipping parse.")
+            return []
+        raw_articles, pages = _page(response)
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Guardian API request failed: {e}")
+        http.record_failure(state, e)
+        return []
+
+    # Only an incremental request has to catch up; the first one takes a page.
+    last_page = min(pages, MAX_PAGES) if cursor else 1
+    for page in range(2, last_page + 1):
+        try:
+            response = _get({**request_params, "page": page})
+            results, _ = _page(response)
+        except requests.exceptions.RequestException as e:
+            # Pages run oldest first, so the cursor stays valid; resume next run.
+            logger.warning(
+                f"Guardian: page {page}/{pages} failed ({e}); resuming later."
+            )
+            break
+        raw_articles.extend(results)
+        if state is not None:
+            state["bytes"] = (state.get("bytes") or 0) + len(response.content)
+    if cursor and pages > MAX_PAGES:
+        logger.info(f"Guardian: {pages} pages pending, fetched {MAX_PAGES}.")
+
+    if state is not None:
+        modified = [a.get("fields", {}).get("lastModified") or "" for a in raw_articles]
+        state["fetch_cursor"] = max(modified + [cursor or ""]) or None
+    return raw_articles
+
+
+def fetch(
+    api_key: str,
+    params: Dict[str, Any] = None,
+    state: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Fetches articles from the Guardian API and returns them in a
+    standardised format.
+
+    If a per-source fetch state is given (see sources.http), the request is
+    made conditional, the response is not decoded when it is unchanged, and
+    state["fetch_cursor"] limits the request to content modified since the
+    previous run (and is advanced to the newest lastModified returned).
+    """
+    if not api_key:
+        logger.error("Guardian API Key is missing.")
+        raise ValueError("GUARDIAN_API_KEY not found in environment variables.")
+
+    articles = _normalise(_fetch_results(api_key, params or DEFAULT_PARAMS, state))
     logger.info(f"Guardian: fetched {len(articles)} articles.")
     return articles
+
+
+def fetch_sections(
+    api_key: str, sections: Dict[str, Dict[str, Any]]
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Fetches several sections with a single OR'd query (section=world|uk-news)
+    and returns the articles split back per section id.
+
+    ``sections`` maps each section id to that source's fetch state.  The
+    request shares one state: it resumes from the oldest of the sections'
+    cursors, and its validators, cursor, size and any error are copied back
+    into every section's state afterwards.
+    """
+    if not api_key:
+        logger.error("Guardian API Key is missing.")
+        raise ValueError("GUARDIAN_API_KEY not found in environment variables.")
+
+    ids = sorted(sections)
+    states = [sections[section_id] for section_id in ids]
+    cursors = [state["fetch_cursor"] for state in states if state.get("fetch_cursor")]
+    shared = {field: states[0].get(field) for field in http.VALIDATOR_FIELDS}
+    shared["fetch_cursor"] = min(cursors) if cursors else None
+
+    params = {
+        **DEFAULT_PARAMS,
+        "section": "|".join(ids),
+        "page-size": min(DEFAULT_PARAMS["page-size"] * len(ids), MAX_PAGE_SIZE),
+    }
+    raw_articles = _fetch_results(api_key, params, shared)
+
+    by_section = {section_id: [] for section_id in ids}
+    for article in raw_articles:
+        section_id = article.get("sectionId")
+        if section_id in by_section:
+            by_section[section_id].append(article)
+
+    for state in states:
+        state.update(shared)
+        # The response size is credited evenly to the sections sharing it.
+        state["bytes"] = (shared.get("bytes") or 0) // len(ids)
+
+    logger.info(
+        f"Guardian: fetched {len(raw_articles)} articles "
+        f"for {len(ids)} section(s) in one request."
+    )
+    return {
+        section_id: _normalise(articles) for section_id, articles in by_section.items()
+    }
+
+
+def fetch_range(
+    api_key: str,
+    from_date: str,
+    to_date: str,
+    params: Dict[str, Any] = None,
+    limiter: Optional[RateLimiter] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Fetches every article published between ``from_date`` and ``to_date``
+    (ISO 8601, inclusive), paging at the maximum page size.  Raises
+    requests.RequestException if a page still fails after its retries.
+    """
+    request_params = {
+        **(params or DEFAULT_PARAMS),
+        "from-date": from_date,
+        "to-date": to_date,
+        "use-date": "published",
+        "order-by": "oldest",
+        "page-size": MAX_PAGE_SIZE,
+        "api-key": api_key,
+    }
+
+    articles = []
+    page, pages = 1, 1
+    while page <= pages:
+        response = _get(
+            {**request_params, "page": page},
+            limiter=limiter,
+            retries=RATE_LIMIT_RETRIES,
+        )
+        results, pages = _page(response)
+        articles.extend(_normalise(results))
+        page += 1
+    return articles
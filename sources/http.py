@@ -0,0 +1,249 @@
+"""
+HTTP helpers shared by the sources.
+
+A source's fetch "state" is a plain dict carried between runs (persisted on
+the Source row).  It holds the validators from the last successful response
+so the next request can be a conditional GET:
+
+    http_etag           ETag response header       -> If-None-Match
+    http_last_modified  Last-Modified header       -> If-Modified-Since
+    content_digest      SHA-256 of the last body   (catches servers that
+                                                     ignore validators)
+
+Sources that can ask for "everything since X" also keep a cursor there:
+
+    fetch_cursor        source-specific position (the Guardian: the newest
+                        lastModified seen)
+
+After a fetch, state["not_modified"] tells the caller whether there is
+anything new to parse, state["bytes"] how large the response body was, and
+state["error"] (set by record_failure) why the fetch failed.  Sources
+return [] on failure, so the error is the only sign of it.
+
+Every request goes through get(), which uses one shared requests.Session:
+connections are pooled per host and kept alive between requests (the BBC
+feeds all share feeds.bbci.co.uk), responses are negotiated as gzip/deflate,
+and bodies are downloaded in chunks, handed to an optional on_chunk callback
+as they arrive (so parsing overlaps the download) and capped at max_bytes.
+Requests, newly opened connections and bytes on the wire / decoded are
+counted per host in utils.metrics; see host_stats() and log_host_stats().
+
+get() can also record every response into a sources.archive.ResponseArchive
+(set_archive), or answer from a ReplayArchive instead of the network
+(set_replay).
+"""
+
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+VALIDATOR_FIELDS = ("http_etag", "http_last_modified", "content_digest")
+CURSOR_FIELDS = ("fetch_cursor",)
+STATE_FIELDS = VALIDATOR_FIELDS + CURSOR_FIELDS  # persisted on the Source row
+
+USER_AGENT = "Amalgamator/1.0"
+REQUEST_TIMEOUT = 10  # seconds
+MAX_RESPONSE_BYTES = 10 * 1024 * 1024  # decoded body; larger responses fail
+CHUNK_SIZE = 64 * 1024
+POOL_HOSTS = 32  # hosts with a connection pool kept open
+POOL_PER_HOST = 8  # idle keep-alive connections kept per host (>= fetch workers)
+
+
+class ResponseTooLarge(requests.exceptions.RequestException):
+    """The response body exceeded the size cap."""
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_connections_seen: Dict[str, int] = {}  # host -> connections counted so far
+_archive = None  # sources.archive.ResponseArchive, records responses
+_replay = None  # sources.archive.ReplayArchive, replaces the network
+
+
+def session() -> requests.Session:
+    """The process-wide session all sources fetch through."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=POOL_HOSTS, pool_maxsize=POOL_PER_HOST
+            )
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+            _session.headers.update(
+                {"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"}
+            )
+        return _session
+
+
+def set_archive(archive) -> None:
+    """Records every response into ``archive`` (None to stop)."""
+    global _archive
+    _archive = archive
+
+
+def set_replay(replay) -> None:
+    """Serves responses from ``replay`` instead of the network (None to stop)."""
+    global _replay
+    _replay = replay
+
+
+def _count_new_connections(url: str, host: str) -> None:
+    """Credits connections the host's pools opened since the last request."""
+    parts = urlparse(url)
+    pools = session().get_adapter(url).poolmanager.pools
+    opened = 0
+    for key in pools.keys():
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        if key.key_host == parts.hostname and key.key_port == port:
+            pool = pools.get(key)
+            opened += pool.num_connections if pool is not None else 0
+    with _session_lock:
+        new = opened - _connections_seen.get(host, 0)
+        _connections_seen[host] = max(opened, _connections_seen.get(host, 0))
+    if new > 0:
+        metrics.HTTP_CONNECTIONS.inc(new, host=host)
+
+
+def get(
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: float = REQUEST_TIMEOUT,
+    max_bytes: int = MAX_RESPONSE_BYTES,
+    on_chunk: Optional[Callable[[bytes], None]] = None,
+    source: str = "",
+) -> requests.Response:
+    """
+    GETs ``url`` through the shared session and returns the response with
+    its body read (response.content works as usual).  ``on_chunk`` receives
+    each decoded chunk as it arrives.  The body is always read to the end so
+    the connection goes back to the pool.  Raises ResponseTooLarge past
+    ``max_bytes`` and requests' own exceptions otherwise; HTTP error
+    statuses are left to the caller.  ``source`` names the requesting source
+    in the response archive.
+    """
+    if _replay is not None:
+        response = _replay.response(source, url)
+        if on_chunk is not None:
+            for start in range(0, len(response.content), CHUNK_SIZE):
+                on_chunk(response.content[start : start + CHUNK_SIZE])
+        return response
+
+    host = urlparse(url).netloc.lower()
+    response = session().get(
+        url, params=params, headers=headers, timeout=timeout, stream=True
+    )
+    try:
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_bytes:
+                raise ResponseTooLarge(f"{url}: response exceeds {max_bytes:,} bytes")
+            chunks.append(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
+        response._content = b"".join(chunks)
+    finally:
+        response.close()  # back to the pool if fully read
+
+        metrics.HTTP_REQUESTS.inc(host=host)
+        metrics.HTTP_WIRE_BYTES.inc(response.raw.tell(), host=host)
+        _count_new_connections(url, host)
+    metrics.HTTP_BODY_BYTES.inc(size, host=host)
+
+    if _archive is not None:
+        try:
+            _archive.record(source, url, params, response)
+        except OSError as e:
+            logger.warning(f"Could not archive the response from {url}: {e}")
+    return response
+
+
+def host_stats() -> Dict[str, Dict[str, float]]:
+    """Per-host totals since start-up: requests, connections and bytes."""
+    columns = {
+        "requests": metrics.HTTP_REQUESTS.snapshot(),
+        "connections": metrics.HTTP_CONNECTIONS.snapshot(),
+        "wire_bytes": metrics.HTTP_WIRE_BYTES.snapshot(),
+        "body_bytes": metrics.HTTP_BODY_BYTES.snapshot(),
+    }
+    hosts = sorted(columns["requests"])
+    return {
+        host: {column: values.get(host, 0) for column, values in columns.items()}
+        for host in hosts
+    }
+
+
+def log_host_stats(since: Optional[Dict[str, Dict[str, float]]] = None) -> None:
+    """Logs per-host connection reuse and transfer sizes (minus ``since``)."""
+    since = since or {}
+    for host, stats in host_stats().items():
+        before = since.get(host, {})
+        delta = {key: value - before.get(key, 0) for key, value in stats.items()}
+        if not delta["requests"]:
+            continue
+        reused = delta["requests"] - delta["connections"]
+        logger.info(
+            f"{host}: {delta['requests']:.0f} request(s), {reused:.0f} on "
+            f"kept-alive connections, {delta['wire_bytes'] / 1024:.0f} KiB on "
+            f"the wire ({delta['body_bytes'] / 1024:.0f} KiB decoded)."
+        )
+
+
+def conditional_headers(state: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """Builds If-None-Match / If-Modified-Since headers from stored validators."""
+    headers = {}
+    if state:
+        if state.get("http_etag"):
+            headers["If-None-Match"] = state["http_etag"]
+        if state.get("http_last_modified"):
+            headers["If-Modified-Since"] = state["http_last_modified"]
+    return headers
+
+
+def apply_validators(
+    state: Optional[Dict[str, Any]], response: requests.Response
+) -> bool:
+    """
+    Records the validators of a response in ``state`` and returns True when
+    the response carries nothing new (a 304, or a body identical to the last
+    one).  With no state, every 200 response counts as new.
+    """
+    if state is not None:
+        state["bytes"] = len(response.content)
+
+    if response.status_code == 304:
+        if state is not None:
+            state["not_modified"] = True
+        return True
+
+    if state is None:
+        return False
+
+    digest = hashlib.sha256(response.content).hexdigest()
+    state["not_modified"] = digest == state.get("content_digest")
+    headers = response.headers
+    state["http_etag"] = headers.get("ETag") or state.get("http_etag")
+    state["http_last_modified"] = headers.get("Last-Modified") or state.get(
+        "http_last_modified"
+    )
+    state["content_digest"] = digest
+    return state["not_modified"]
+
+
+def record_failure(state: Optional[Dict[str, Any]], error: Exception) -> None:
+    """Marks the fetch as failed in ``state`` (read by utils.health)."""
+    if state is not None:
+        state["error"] = f"{type(error).__name__}: {error}"
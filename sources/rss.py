@@ -1,12 +1,35 @@
+"""
+RSS / Atom source.
+
+Feeds are parsed with an incremental XML parser (xml.etree XMLPullParser)
+fed each chunk of the body as sources.http downloads it.  It reads entries
+one at a time and extracts only the fields of the standard article dict.
+It stops as soon as ``max_items`` entries are collected, or at the first
+entry whose hash is in ``known_hashes`` (feeds list newest first, so
+everything after it has been seen before).  Feeds that are not well-formed
+XML are re-parsed with feedparser, which tolerates broken markup.
+"""
+
 import logging
+import xml.etree.ElementTree as ET
 from datetime import timezone
 from email.utils import parsedate_to_datetime
-from typing import List, Dict, Any, Optional
+from typing import Iterator, List, Dict, Any, Optional, Set
 
 import feedparser
+import requests
+
+from sources import http
+from utils.dedup import article_hash
 
 logger = logging.getLogger(__name__)
 
+REQUEST_TIMEOUT = 10  # seconds
+
+ENTRY_TAGS = ("item", "entry")  # RSS 0.9x/1.0/2.0, Atom
+FEED_TAGS = ("rss", "RDF", "feed")
+DATE_TAGS = ("pubDate", "published", "updated", "date")  # in order of preference
+
 
 def _normalise_date(raw_date: str) -> str:
     """
@@ -23,11 +46,167 @@ def _normalise_date(raw_date: str) -> str:
         return raw_date  # already ISO or unparseable — pass through
 
 
+def _local(tag: str) -> str:
+    """Tag name without its XML namespace."""
+    return tag.rpartition("}")[2]
+
+
+def _entry_article(elem, source_name: str, section: str) -> Dict[str, Any]:
+    """Maps an RSS <item> / Atom <entry> element onto the standard article."""
+    fields = {}
+    link = ""
+    category = ""
+    for child in elem:
+        name = _local(child.tag)
+        if name == "link":
+            # Atom: <link rel="alternate" href="..."/>; RSS: <link>url</link>
+            rel = child.get("rel", "alternate")
+            if not link and rel == "alternate":
+                link = (child.get("href") or child.text or "").strip()
+        elif name in ("category", "subject"):  # dc:subject in RSS 1.0
+            if not category:
+                category = (child.get("term") or child.text or "").strip()
+        elif name not in fields:
+            fields[name] = (child.text or "").strip()
+
+    raw_date = next((fields[tag] for tag in DATE_TAGS if fields.get(tag)), "")
+    return {
+        "source": source_name,
+        "headline": fields.get("title", ""),
+        "sectionName": section or category,
+        "lastModified": _normalise_date(raw_date),
+        "webUrl": link,
+    }
+
+
+class _FeedStream:
+    """
+    Incremental RSS/Atom parser, fed body chunks as they are downloaded.
+    Collects articles until ``done``; a document that is not well-formed XML
+    or not a feed stops it with ``error`` set instead of raising, so the
+    download still completes for the feedparser fallback.
+    """
+
+    def __init__(
+        self,
+        source_name: str,
+        section: str,
+        max_items: Optional[int],
+        known_hashes: Optional[Set[str]],
+    ):
+        self.source_name = source_name
+        self.section = section
+        self.max_items = max_items
+        self.known_hashes = known_hashes
+        self.articles: List[Dict[str, Any]] = []
+        self.done = False
+        self.error: Optional[Exception] = None
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._root_seen = False
+        self._depth = 0  # > 0 while inside an entry
+
+    def feed(self, chunk: bytes) -> None:
+        if self.done:
+            return
+        try:
+            self._parser.feed(chunk)
+            self._read_events()
+        except (ET.ParseError, ValueError) as e:
+            self.error = e
+            self.done = True
+
+    def close(self) -> None:
+        """Ends the document; a truncated feed sets ``error``."""
+        if not self.done:
+            self.feed(b"")
+        if not self.done:
+            try:
+                self._parser.close()
+                self._read_events()
+            except ET.ParseError as e:
+                self.error = e
+            self.done = True
+
+    def _read_events(self) -> None:
+        for event, elem in self._parser.read_events():
+            if not self._root_seen:
+                self._root_seen = True
+                if _local(elem.tag) not in FEED_TAGS:
+                    raise ValueError(
+                        f"not an RSS or Atom document (<{_local(elem.tag)}>)"
+                    )
+            if _local(elem.tag) not in ENTRY_TAGS:
+                continue
+            if event == "start":
+                self._depth += 1
+                continue
+            self._depth -= 1
+            if self._depth:
+                continue  # an entry nested in an entry (e.g. Atom <source>)
+
+            article = _entry_article(elem, self.source_name, self.section)
+            elem.clear()
+            self.add(article)
+            if self.done:
+                return
+
+    def add(self, article: Dict[str, Any]) -> None:
+        if self.known_hashes and article_hash(article) in self.known_hashes:
+            logger.debug(
+                f"{self.source_name}: reached a stored article after "
+                f"{len(self.articles)} new entries; stopping."
+            )
+            self.done = True
+            return
+        self.articles.append(article)
+        if self.max_items and len(self.articles) >= self.max_items:
+            self.done = True
+
+
+def _feedparser_entries(feed, source_name: str, section: str) -> Iterator[dict]:
+    """Normalises parsed feedparser entries into the standard article format."""
+    for entry in feed.entries:
+        # Use 'published' first, fall back to 'updated', then empty
+        last_modified = _normalise_date(
+            entry.get("published", entry.get("updated", ""))
+        )
+
+        # Some feeds provide tags/categories we can use as section
+        entry_section = section
+        if not entry_section and entry.get("tags"):
+            entry_section = entry["tags"][0].get("term", "")
+
+        yield {
+            "source": source_name,
+            "headline": entry.get("title", ""),
+            "sectionName": entry_section,
+            "lastModified": last_modified,
+            "webUrl": entry.get("link", ""),
+        }
+
+
+def _parse_with_feedparser(
+    content: bytes, response: requests.Response, feed_url: str
+) -> Any:
+    feed = feedparser.parse(
+        content,
+        response_headers={
+            "content-type": response.headers.get("Content-Type", ""),
+            "content-location": feed_url,
+        },
+    )
+    if feed.bozo and feed.bozo_exception:
+        logger.warning(f"RSS parse warning for {feed_url}: {feed.bozo_exception}")
+    return feed
+
+
 def fetch(
     feed_url: str,
     source_name: str,
     section: str = "",
     max_items: Optional[int] = None,
+    state: Optional[Dict[str, Any]] = None,
+    known_hashes: Optional[Set[str]] = None,
 ) -> List[Dict[str, Any]]:
     """
     Fetches articles from any RSS/Atom feed and returns them in
@@ -38,45 +217,52 @@ def fetch(
         source_name: Human-readable name (e.g. "BBC News").
         section:     Section label to attach (e.g. "Technology").
         max_items:   Optional cap on number of articles returned.
+        state:       Optional per-source fetch state (see sources.http). Its
+                     validators make this a conditional GET and are updated
+                     in place; nothing is parsed if the feed is unchanged.
+        known_hashes: Optional hashes of articles already stored for this
+                     source; parsing stops at the first entry among them.
     """
     logger.debug(f"Fetching RSS feed: {feed_url}")
 
+    # Entries are parsed as the body downloads; the validators are checked
+    # once it is complete.
+    stream = _FeedStream(source_name, section, max_items, known_hashes)
     try:
-        feed = feedparser.parse(
-            feed_url, request_headers={"User-Agent": "Amalgamator/1.0"}
+        response = http.get(
+            feed_url,
+            headers=http.conditional_headers(state),
+            timeout=REQUEST_TIMEOUT,
+            on_chunk=stream.feed,
+            source=source_name,
         )
-    except Exception as e:
+        if response.status_code != 304:
+            response.raise_for_status()
+    except requests.exceptions.RequestException as e:
         logger.error(f"RSS fetch failed for {feed_url}: {e}")
+        http.record_failure(state, e)
         return []
 
-    if feed.bozo and feed.bozo_exception:
-        logger.warning(f"RSS parse warning for {feed_url}: {feed.bozo_exception}")
-
-    entries = feed.entries
-    if max_items:
-        entries = entries[:max_items]
-
-    articles = []
-    for entry in entries:
-        # Use 'published' first, fall back to 'updated', then empty
-        last_modified = _normalise_date(
-            entry.get("published", entry.get("updated", ""))
-        )
-
-        # Some feeds provide tags/categories we can use as section
-        entry_section = section
-        if not entry_section and entry.get("tags"):
-            entry_section = entry["tags"][0].get("term", "")
+    if http.apply_validators(state, response):
+        logger.info(f"{source_name}: feed not modified, skipping parse.")
+        return []
 
-        articles.append(
-            {
-                "source": source_name,
-                "headline": entry.get("title", ""),
-                "sectionName": entry_section,
-                "lastModified": last_modified,
-                "webUrl": entry.get("link", ""),
-            }
-        )
+    stream.close()
+    articles = stream.articles
+    if stream.error is not None:
+        logger.info(f"{source_name}: falling back to feedparser ({stream.error}).")
+        try:
+            feed = _parse_with_feedparser(response.content, response, feed_url)
+            fallback = _FeedStream(source_name, section, max_items, known_hashes)
+            for article in _feedparser_entries(feed, source_name, section):
+                fallback.add(article)
+                if fallback.done:
+                    break
+            articles = fallback.articles
+        except Exception as e:
+            logger.error(f"RSS parse failed for {feed_url}: {e}")
+            http.record_failure(state, e)
+            return []
 
     logger.info(f"{source_name}: fetched {len(articles)} articles from RSS.")
     return articles
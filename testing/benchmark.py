@@ -0,0 +1,603 @@
+"""
+End-to-end benchmark suite — no network, no Gmail.
+Run:  python -m testing.benchmark                         # default scale
+      python -m testing.benchmark --articles 100000 --users 2000 --repeat 5
+      python -m testing.benchmark --compare testing/results/<earlier>.json
+
+Everything runs against local stand-ins:
+
+    feeds     synthetic RSS / Atom feeds and a Guardian-shaped JSON search
+              endpoint, served by ThreadingHTTPServers on 127.0.0.1 (one per
+              --hosts, so the fetch pool's per-host cap behaves as in
+              production); --feed-latency adds a delay to every response
+    database  a throwaway SQLite file generated at the requested scale
+              (sources, articles, users, subscriptions, deliveries)
+    Gmail     FakeGmailClient, which accepts batches after --mail-latency
+
+Each stage is timed separately over --repeat runs, with the DB reset
+between runs: fetch_all_sources, deduplicate, save_articles, render
+(render_digest_body, cold and warm card cache) and deliver_to_users.
+Results are written as JSON (with the git commit) to testing/results/, and
+--compare prints the median of each stage against an earlier result file.
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+from sqlalchemy import delete, func, insert, select, text, update
+
+import db
+from db.migrate_schema import upgrade
+from db.models import (
+    Article,
+    Source,
+    SourceHealth,
+    User,
+    UserDelivery,
+    UserSubscription,
+    UserWatermark,
+)
+from sources import guardian
+from utils import delivery_pool, metrics
+from utils.dedup import article_hash, deduplicate
+from utils.email_service import card_cache, render_digest_body
+from utils.storage import find_existing_hashes, save_articles
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+TIMEZONES = ["Europe/Berlin", "Europe/London", "America/New_York", "Asia/Tokyo"]
+GUARDIAN_SECTIONS = ("world", "uk-news", "technology")
+
+
+# --- Local feed server ---
+
+
+def _rss(feed_id: int, items: int, now: datetime) -> bytes:
+    entries = "".join(
+        f"<item><title>{escape(f'Feed {feed_id} story {j}')}</title>"
+        f"<link>https://example.com/{feed_id}/{j}</link>"
+        f"<pubDate>{format_datetime(now - timedelta(minutes=j))}</pubDate>"
+        f"<category>bench</category></item>"
+        for j in range(items)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+        f"<title>Feed {feed_id}</title><link>https://example.com/{feed_id}</link>"
+        f"<description>Synthetic feed</description>{entries}</channel></rss>"
+    ).encode()
+
+
+def _atom(feed_id: int, items: int, now: datetime) -> bytes:
+    entries = "".join(
+        f"<entry><title>{escape(f'Feed {feed_id} story {j}')}</title>"
+        f'<link href="https://example.com/{feed_id}/{j}"/>'
+        f"<id>urn:bench:{feed_id}:{j}</id>"
+        f"<updated>{(now - timedelta(minutes=j)).isoformat()}</updated></entry>"
+        for j in range(items)
+    )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<feed xmlns="http://www.w3.org/2005/Atom">'
+        f"<title>Feed {feed_id}</title><id>urn:bench:{feed_id}</id>"
+        f"<updated>{now.isoformat()}</updated>{entries}</feed>"
+    ).encode()
+
+
+def _guardian_json(section: str, items: int, now: datetime, query: dict) -> bytes:
+    page = int(query.get("page", ["1"])[0])
+    page_size = int(query.get("page-size", [items])[0])
+    sections = section.split("|")  # OR'd sections share the items
+    results = []
+    for j in range(items):
+        section_id = sections[j % len(sections)]
+        results.append(
+            {
+                "sectionId": section_id,
+                "sectionName": section_id.title(),
+                "webUrl": f"https://www.theguardian.com/{section_id}/{j}",
+                "fields": {
+                    "headline": f"Guardian {section_id} story {j}",
+                    "lastModified": (now - timedelta(minutes=j)).isoformat(),
+                },
+            }
+        )
+    if query.get("order-by") == ["oldest"]:
+        results.reverse()
+    body = {
+        "status": "ok",
+        "currentPage": page,
+        "pages": -(-items // page_size),
+        "results": results[(page - 1) * page_size : page * page_size],
+    }
+    return json.dumps({"response": body}).encode()
+
+
+def start_feed_servers(hosts: int, items: int, latency: float) -> List[str]:
+    """Starts ``hosts`` local feed servers; returns their base URLs."""
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like real feed servers
+        disable_nagle_algorithm = True  # headers and body go out separately
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = url.path.strip("/").split("/")
+            if latency:
+                time.sleep(latency)
+            if parts[0] == "rss":
+                body, ctype = _rss(int(parts[1]), items, now), "application/rss+xml"
+            elif parts[0] == "atom":
+                body, ctype = _atom(int(parts[1]), items, now), "application/atom+xml"
+            elif parts[0] == "search":
+                query = parse_qs(url.query)
+                section = query.get("section", ["world"])[0]
+                body = _guardian_json(section, items, now, query)
+                ctype = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gzip.compress(body, compresslevel=5)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    urls = []
+    for _ in range(max(1, hosts)):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        urls.append(f"http://127.0.0.1:{server.server_port}")
+    return urls
+
+
+# --- Fake Gmail transport ---
+
+
+class FakeGmailClient:
+    """Stands in for utils.email_service.GmailClient; accepts every message."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages: List[Dict[str, str]]) -> List[Any]:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            first = self.sent
+            self.sent += len(messages)
+        return [f"bench-{first + i}" for i in range(len(messages))]
+
+
+# --- Synthetic database ---
+
+
+def build_database(args, base_urls: List[str]) -> Dict[str, int]:
+    """Creates the schema and fills it at the requested scale."""
+    rng = random.Random(args.seed)
+    engine = db.get_engine()
+    upgrade(engine)
+    now = datetime.now(timezone.utc)
+
+    sources = []
+    for i in range(args.sources):
+        kind = "rss" if i % 2 == 0 else "atom"
+        sources.append(
+            {
+                "source_name": f"Bench Feed {i}",
+                "section": "",
+                "source_type": "rss",
+                "url": f"{base_urls[i % len(base_urls)]}/{kind}/{i}",
+                "active": True,
+            }
+        )
+    if args.guardian:
+        # Routed to guardian.fetch_sections by their URL (one request for
+        # all sections); it goes to guardian.API_URL, the local server.
+        sources.extend(
+            {
+                "source_name": "The Guardian",
+                "section": section,
+                "source_type": "api",
+                "url": f"https://content.guardianapis.com/search?section={section}",
+                "active": True,
+            }
+            for section in GUARDIAN_SECTIONS
+        )
+    names = [s["source_name"] for s in sources]
+
+    with engine.begin() as conn:
+        conn.execute(insert(Source), sources)
+
+        rows = []
+        for i in range(args.articles):
+            article = {
+                "headline": f"Archived story {i}",
+                "lastModified": (
+                    now - timedelta(seconds=args.articles - i)
+                ).isoformat(),
+            }
+            rows.append(
+                {
+                    "date_added": now.isoformat(),
+                    "last_modified": article["lastModified"],
+                    "source": names[rng.randrange(len(names))],
+                    "section_name": "bench",
+                    "headline": article["headline"],
+                    "web_url": f"https://example.com/archive/{i}",
+                    "hash": article_hash(article),
+                }
+            )
+        for start in range(0, len(rows), 5000):
+            conn.execute(insert(Article), rows[start : start + 5000])
+
+        conn.execute(
+            insert(User),
+            [
+                {
+                    "email": f"bench{i}@example.com",
+                    "first_name": f"Bench{i}",
+                    "last_name": "",
+                    "timezone": TIMEZONES[i % len(TIMEZONES)],
+                    "delivery_schedule": "daily",
+                    "active": True,
+                    "tier": 1,
+                }
+                for i in range(args.users)
+            ],
+        )
+        source_ids = [row[0] for row in conn.execute(select(Source.id))]
+        user_ids = [row[0] for row in conn.execute(select(User.id))]
+        per_user = min(args.subscriptions, len(source_ids))
+        conn.execute(
+            insert(UserSubscription),
+            [
+                {"user_id": user_id, "source_id": source_id}
+                for user_id in user_ids
+                for source_id in rng.sample(source_ids, per_user)
+            ],
+        )
+
+        # Everything up to the cutoff counts as delivered; the rest is pending.
+        cutoff = int(args.articles * args.delivered)
+        conn.execute(
+            text(
+                "INSERT INTO user_deliveries (user_id, article_id, delivered_at) "
+                "SELECT DISTINCT us.user_id, a.id, :now FROM user_subscriptions us "
+                "JOIN news_sources s ON s.id = us.source_id "
+                "JOIN news_articles a ON a.source = s.source_name "
+                "WHERE a.id <= :cutoff"
+            ),
+            {"now": now.replace(tzinfo=None), "cutoff": cutoff},
+        )
+        deliveries = conn.execute(select(func.count(UserDelivery.id))).scalar()
+
+    return {"max_article_id": args.articles, "cutoff": cutoff, "deliveries": deliveries}
+
+
+def reset_fetch_state(baseline: Dict[str, int]) -> None:
+    """Forgets what the last fetch run stored, so every run fetches the same."""
+    with db.get_engine().begin() as conn:
+        conn.execute(delete(Article).where(Article.id > baseline["max_article_id"]))
+        conn.execute(delete(SourceHealth))
+        conn.execute(
+            update(Source).values(
+                http_etag=None,
+                http_last_modified=None,
+                content_digest=None,
+                fetch_cursor=None,
+                poll_interval=None,
+                publish_rate=None,
+                last_polled_at=None,
+                next_poll_at=None,
+            )
+        )
+
+
+def reset_delivery_state(baseline: Dict[str, int]) -> None:
+    """Makes the articles above the cutoff pending again for every user."""
+    with db.get_engine().begin() as conn:
+        conn.execute(
+            delete(UserDelivery).where(UserDelivery.article_id > baseline["cutoff"])
+        )
+        conn.execute(delete(UserWatermark))
+        conn.execute(update(User).values(last_delivered_at=None))
+
+
+# --- Stages ---
+
+
+def _time_runs(
+    repeat: int, run: Callable[[], Any], before: Callable[[], None] = None
+) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        if before:
+            before()
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def _summary(timings: List[float], **extra) -> Dict[str, Any]:
+    return {
+        "runs": [round(t, 6) for t in timings],
+        "min": round(min(timings), 6),
+        "median": round(statistics.median(timings), 6),
+        "mean": round(statistics.fmean(timings), 6),
+        **extra,
+    }
+
+
+def _sample_articles(count: int) -> List[Dict[str, Any]]:
+    """Up to ``count`` stored articles as standard article dicts."""
+    session = db.get_session()
+    try:
+        stmt = select(Article).order_by(Article.id.desc()).limit(count)
+        return [{**a.to_dict(), "id": a.id} for a in session.scalars(stmt)]
+    finally:
+        session.close()
+
+
+def run_benchmarks(args) -> Dict[str, Any]:
+    import main  # after the DB is configured and Gmail is swapped out
+
+    bench_logger = logging.getLogger("main")
+    base_urls = start_feed_servers(args.hosts, args.items_per_feed, args.feed_latency)
+    guardian.API_URL = f"{base_urls[0]}/search"
+    os.environ["GUARDIAN_API_KEY"] = "bench"
+
+    fake_gmail = FakeGmailClient(args.mail_latency)
+    main.get_gmail_client = lambda: fake_gmail
+    # The fake transport has no quota; keep the limiter out of the timings.
+    delivery_pool.SEND_RATE = 1e9
+    delivery_pool.SEND_BURST = 1e9
+    delivery_pool.DAILY_SEND_LIMIT = None
+
+    started = time.perf_counter()
+    baseline = build_database(args, base_urls)
+    logger.info(
+        f"Built DB in {time.perf_counter() - started:.1f}s: {args.articles} articles, "
+        f"{args.users} users, {baseline['deliveries']} deliveries."
+    )
+
+    results = {}
+
+    # fetch_all_sources: network + parse + dedup + save for every source
+    timings = _time_runs(
+        args.repeat,
+        lambda: main.fetch_all_sources(bench_logger, poll_all=True),
+        before=lambda: reset_fetch_state(baseline),
+    )
+    results["fetch_all_sources"] = _summary(timings, sources=args.sources)
+    logger.info(
+        f"fetch_all_sources: median {results['fetch_all_sources']['median']:.3f}s"
+    )
+
+    # deduplicate: half already stored, half new
+    stored = [
+        {k: a[k] for k in ("headline", "lastModified", "source", "webUrl")}
+        for a in _sample_articles(args.batch // 2)
+    ]
+    fresh = [
+        {
+            "headline": f"Fresh story {i}",
+            "lastModified": datetime.now(timezone.utc).isoformat(),
+            "source": "Bench Feed 0",
+            "webUrl": f"https://example.com/fresh/{i}",
+            "sectionName": "bench",
+        }
+        for i in range(args.batch - len(stored))
+    ]
+    batch = stored + fresh
+    timings = _time_runs(
+        args.repeat, lambda: deduplicate(batch, lookup=find_existing_hashes)
+    )
+    results["deduplicate"] = _summary(timings, articles=len(batch))
+    logger.info(f"deduplicate: median {results['deduplicate']['median']:.3f}s")
+
+    # save_articles: insert a batch of new rows
+    rows = deduplicate(fresh, lookup=find_existing_hashes)
+    hashes = [row["hash"] for row in rows]
+
+    def drop_saved():
+        with db.get_engine().begin() as conn:
+            conn.execute(delete(Article).where(Article.hash.in_(hashes)))
+
+    timings = _time_runs(args.repeat, lambda: save_articles(rows), before=drop_saved)
+    drop_saved()
+    results["save_articles"] = _summary(timings, articles=len(rows))
+    logger.info(f"save_articles: median {results['save_articles']['median']:.3f}s")
+
+    # render: one digest body, with a cold and a warm card cache
+    digest = _sample_articles(args.digest_size)
+    timings = _time_runs(
+        args.repeat,
+        lambda: render_digest_body(digest, TIMEZONES[0]),
+        before=card_cache.clear,
+    )
+    results["render_cold"] = _summary(timings, articles=len(digest))
+    timings = _time_runs(args.repeat, lambda: render_digest_body(digest, TIMEZONES[0]))
+    results["render_warm"] = _summary(timings, articles=len(digest))
+    logger.info(
+        f"render: median cold {results['render_cold']['median'] * 1000:.2f}ms, "
+        f"warm {results['render_warm']['median'] * 1000:.2f}ms"
+    )
+
+    # deliver_to_users: pending lookup, cohorts, render, fake send, record
+    sent_before = fake_gmail.sent
+    timings = _time_runs(
+        args.repeat,
+        lambda: main.deliver_to_users(bench_logger),
+        before=lambda: (reset_delivery_state(baseline), card_cache.clear()),
+    )
+    results["deliver_to_users"] = _summary(
+        timings,
+        users=args.users,
+        emails_per_run=(fake_gmail.sent - sent_before) // max(args.repeat, 1),
+    )
+    logger.info(
+        f"deliver_to_users: median {results['deliver_to_users']['median']:.3f}s"
+    )
+
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current: Dict[str, Any], baseline_path: str) -> None:
+    """Logs each stage's median against an earlier results file."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    logger.info(f"Compared with {baseline.get('commit')} ({baseline_path}):")
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            logger.info(f"  {name:<18} new")
+            continue
+        ratio = result["median"] / before["median"] if before["median"] else 0
+        logger.info(
+            f"  {name:<18} {before['median']:.4f}s -> {result['median']:.4f}s "
+            f"({ratio:.2f}x)"
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the fetch and delivery paths."
+    )
+    scale = parser.add_argument_group("scale")
+    scale.add_argument(
+        "--sources", type=int, default=20, help="feeds to serve and fetch"
+    )
+    scale.add_argument("--items-per-feed", type=int, default=50)
+    scale.add_argument("--articles", type=int, default=20000, help="stored articles")
+    scale.add_argument("--users", type=int, default=200)
+    scale.add_argument("--subscriptions", type=int, default=5, help="sources per user")
+    scale.add_argument(
+        "--delivered",
+        type=float,
+        default=0.95,
+        help="share of stored articles already delivered (default 0.95)",
+    )
+    scale.add_argument(
+        "--batch", type=int, default=2000, help="dedup / save batch size"
+    )
+    scale.add_argument(
+        "--digest-size", type=int, default=50, help="articles per digest"
+    )
+    scale.add_argument(
+        "--no-guardian",
+        dest="guardian",
+        action="store_false",
+        help="do not include a Guardian-shaped source",
+    )
+    env = parser.add_argument_group("stand-ins")
+    env.add_argument("--hosts", type=int, default=4, help="local feed servers")
+    env.add_argument(
+        "--feed-latency", type=float, default=0.0, help="seconds per response"
+    )
+    env.add_argument(
+        "--mail-latency", type=float, default=0.0, help="seconds per batch"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db", help="SQLite file to build (default: a temp file)")
+    parser.add_argument("--profile", default="worker", help="DB engine profile")
+    parser.add_argument("--output", help="results file (default: testing/results/)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show app logs")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+    )
+    logger.setLevel(logging.INFO)
+
+    workdir = tempfile.TemporaryDirectory(prefix="amalgamator-bench-")
+    db_path = args.db or os.path.join(workdir.name, "bench.db")
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    db.configure(args.profile, url=f"sqlite:///{db_path}")
+
+    try:
+        results = run_benchmarks(args)
+    finally:
+        db.get_engine().dispose()
+        workdir.cleanup()
+
+    commit = _git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "db_profile": db.profile,
+        "delivery_mode": os.getenv("AMALGAMATOR_DELIVERY_MODE", "rows"),
+        "scale": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("db", "output", "compare", "verbose")
+        },
+        "results": results,
+        "metrics": metrics.summary(),
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{commit}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Results written to {output}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Tests for the delivery retry schedule of main.run_daemon.
+Run:  python -m pytest testing/test_daemon.py
+"""
+
+import base64
+import logging
+import signal
+import threading
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+import db
+import main
+from db.migrate_schema import upgrade
+from db.models import Article, Source, User, UserSubscription
+from utils import delivery_pool
+from utils.rate_limit import TokenBucket
+
+RUN_SECONDS = 2.0
+BAD_ADDRESS = "bounce@example.com"
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    """
+    A scratch database with two users subscribed to a source with one
+    article, and a run(send_batch, daily_limit) that drives run_daemon for
+    RUN_SECONDS and returns how many delivery runs it made.
+    """
+    db.configure("default", url=f"sqlite:///{tmp_path / 'daemon.db'}")
+    upgrade()
+    session = db.get_session()
+    source = Source(source_name="BBC News", source_type="rss", url="http://feed")
+    session.add(source)
+    session.flush()
+    for email in ("reader@example.com", BAD_ADDRESS):
+        user = User(email=email, first_name="Test")
+        session.add(user)
+        session.flush()
+        session.add(UserSubscription(user_id=user.id, source_id=source.id))
+    session.add(
+        Article(
+            source="BBC News",
+            section_name="World",
+            headline="Headline",
+            web_url="https://example.com/1",
+            last_modified="2026-10-17T09:00:00Z",
+            date_added="2026-10-17",
+            hash="a" * 64,
+        )
+    )
+    session.commit()
+    session.close()
+
+    monkeypatch.setattr(main, "fetch_all_sources", lambda logger: None)
+    handlers = {}
+    monkeypatch.setattr(
+        signal, "signal", lambda signum, handler: handlers.setdefault(signum, handler)
+    )
+    runs = []
+    deliver = main.deliver_to_users
+
+    def counting_deliver(*args, **kwargs):
+        runs.append(kwargs.get("user_ids"))
+        return deliver(*args, **kwargs)
+
+    monkeypatch.setattr(main, "deliver_to_users", counting_deliver)
+
+    def run(send_batch, daily_limit):
+        client = type("FakeGmail", (), {"send_batch": staticmethod(send_batch)})
+        monkeypatch.setattr(main, "get_gmail_client", lambda: client)
+        monkeypatch.setattr(
+            delivery_pool,
+            "_limiter",
+            TokenBucket(1000, burst=1000, daily_limit=daily_limit),
+        )
+        stopper = threading.Timer(
+            RUN_SECONDS, lambda: handlers[signal.SIGTERM](signal.SIGTERM, None)
+        )
+        stopper.start()
+        try:
+            main.run_daemon(logging.getLogger("test"), fetch_interval=3600)
+        finally:
+            stopper.cancel()
+        return runs
+
+    yield run
+    db.configure("default")
+
+
+def _bounce() -> HttpError:
+    return HttpError(httplib2.Response({"status": 400}), b"invalid recipient")
+
+
+def test_failed_send_is_retried_with_backoff(daemon):
+    attempts = []
+
+    def send_batch(messages):
+        outcomes = []
+        for message in messages:
+            to = base64.urlsafe_b64decode(message["raw"]).decode()
+            bad = f"To: {BAD_ADDRESS}" in to
+            attempts.append(bad)
+            outcomes.append(_bounce() if bad else "message-id")
+        return outcomes
+
+    runs = daemon(send_batch, daily_limit=500)
+
+    # One delivery run; the bounced user waits DELIVERY_RETRY instead of
+    # being re-queued as due straight away.
+    assert len(runs) == 1
+    assert attempts.count(True) == 1
+    assert attempts.count(False) == 1
+
+
+def test_quota_exhaustion_waits_for_the_next_day(daemon):
+    sent = []
+
+    def send_batch(messages):
+        sent.extend(messages)
+        return ["message-id"] * len(messages)
+
+    runs = daemon(send_batch, daily_limit=1)
+
+    assert len(runs) == 1
+    assert sent == []
@@ -0,0 +1,59 @@
+"""
+Tests for utils.delivery_pool.
+Run:  python -m pytest testing/test_delivery_pool.py
+"""
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from utils import delivery_pool
+from utils.rate_limit import TokenBucket
+
+
+class _FakeSession:
+    def __init__(self):
+        self.committed = False
+
+    def execute(self, stmt):
+        pass
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _unavailable() -> HttpError:
+    return HttpError(httplib2.Response({"status": 503}), b"backend error")
+
+
+def test_quota_exhausted_on_retry_records_confirmed_sends(monkeypatch):
+    monkeypatch.setattr(delivery_pool, "get_session", _FakeSession)
+    monkeypatch.setattr(delivery_pool, "_backoff", lambda attempt: 0)
+
+    def send_batch(messages):
+        # First attempt: 7 sent, 3 hit a transient 503.
+        return [
+            f"id-{m['raw']}" if int(m["raw"]) < 7 else _unavailable() for m in messages
+        ]
+
+    recorded = []
+    jobs = [
+        {"email": f"user{n}@example.com", "message": {"raw": str(n)}} for n in range(10)
+    ]
+    counts = delivery_pool.run_delivery_jobs(
+        jobs,
+        send_batch=send_batch,
+        record=lambda session, job: recorded.append(job["message"]["raw"]),
+        workers=1,
+        limiter=TokenBucket(1000, burst=1000, daily_limit=11),
+    )
+
+    # The retry of the 3 failures would exceed the quota; the 7 already
+    # confirmed by Gmail must still be recorded.
+    assert counts == {"sent": 7, "failed": 0, "skipped": 3}
+    assert recorded == [str(n) for n in range(7)]
@@ -1,38 +1,69 @@
 import hashlib
 import logging
 from datetime import datetime
-from typing import List, Dict, Any, Set
+from typing import Callable, Iterable, List, Dict, Any, Optional, Set
+
+from utils import metrics
 
 logger = logging.getLogger(__name__)
 
+LOG_SAMPLE = 5  # new headlines listed per batch at DEBUG
+
+
+def article_hash(article: Dict[str, Any]) -> str:
+    """SHA-256 of headline + lastModified — the identity of an article."""
+    hash_input = article.get("headline", "") + article.get("lastModified", "")
+    return hashlib.sha256(hash_input.encode()).hexdigest()
+
 
 def deduplicate(
-    articles: List[Dict[str, Any]], seen_hashes: Set[str]
+    articles: List[Dict[str, Any]],
+    seen_hashes: Optional[Set[str]] = None,
+    lookup: Optional[Callable[[Iterable[str]], Set[str]]] = None,
 ) -> List[Dict[str, Any]]:
     """
     Generates hashes for articles and filters out duplicates.
     Expects articles in the standardised format (with 'headline' and 'lastModified').
     Returns a list of new article dicts with 'date_added' and 'hash' fields added.
-    """
-    new_rows = []
 
-    for article in articles:
-        headline = article.get("headline", "")
-        last_modified = article.get("lastModified", "")
+    Already-stored hashes come from ``seen_hashes`` (a preloaded set) and/or
+    ``lookup``, a callable given this batch's candidate hashes that returns
+    the ones already stored (e.g. utils.storage.find_existing_hashes), so the
+    cost scales with the batch rather than the whole table.
+    """
+    if seen_hashes is None:
+        seen_hashes = set()
+    hashes = [article_hash(article) for article in articles]
 
-        hash_input = headline + last_modified
-        article_hash = hashlib.sha256(hash_input.encode()).hexdigest()
+    if lookup is not None and hashes:
+        seen_hashes |= lookup(set(hashes) - seen_hashes)
 
-        logger.debug(f"Processing: '{headline}' | Hash: {article_hash}")
+    new_rows = []
+    date_added = datetime.now().isoformat()
 
-        if article_hash not in seen_hashes:
-            logger.info(f"New article detected: {headline}")
+    for article, hash_value in zip(articles, hashes):
+        if hash_value not in seen_hashes:
             row = article.copy()
-            row["date_added"] = datetime.now().isoformat()
-            row["hash"] = article_hash
+            row["date_added"] = date_added
+            row["hash"] = hash_value
             new_rows.append(row)
-            seen_hashes.add(article_hash)
-        else:
-            logger.debug(f"Duplicate skipped: {headline}")
+            seen_hashes.add(hash_value)
+
+    # One summary per batch instead of a record per article; the headlines
+    # themselves are only sampled.
+    duplicates = len(articles) - len(new_rows)
+    if articles and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Dedup: %d candidate(s), %d new, %d duplicate(s).",
+            len(articles),
+            len(new_rows),
+            duplicates,
+        )
+        for row in new_rows[:LOG_SAMPLE]:
+            logger.debug("  new: %s [%.12s]", row.get("headline", ""), row["hash"])
+        if len(new_rows) > LOG_SAMPLE:
+            logger.debug("  ... and %d more.", len(new_rows) - LOG_SAMPLE)
 
+    metrics.DEDUP_CANDIDATES.inc(len(articles))
+    metrics.DEDUP_DUPLICATES.inc(duplicates)
     return new_rows
@@ -0,0 +1,288 @@
+"""
+Set-based queries for the per-user delivery layer.
+
+Pending articles for every active user are computed by a single joined
+query (subscriptions -> sources -> articles) with a NOT EXISTS anti-join
+on user_deliveries, so the cost does not grow with delivery history and no
+article-id lists are shipped back to SQLite.
+
+Two delivery-tracking modes are supported (AMALGAMATOR_DELIVERY_MODE):
+
+    rows       one user_deliveries row per (user, article) — the default
+    watermark  a per-user high-water mark on Article.id (user_watermarks);
+               pending work is a range scan above the mark, and
+               user_deliveries rows above it are treated as exceptions
+
+Existing databases are moved to watermarks with `python -m db.migrate_watermarks`.
+"""
+
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import exists, func, select, update
+from sqlalchemy.orm import Session
+
+from db.models import (
+    Article,
+    Source,
+    User,
+    UserDelivery,
+    UserSubscription,
+    UserWatermark,
+)
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_MODES = ("rows", "watermark")
+DELIVERY_MODE = os.getenv("AMALGAMATOR_DELIVERY_MODE", "rows")
+USER_ID_BATCH = 500  # stays well under SQLite's bound-parameter limit
+
+
+def _check_mode(mode: str) -> str:
+    if mode not in DELIVERY_MODES:
+        raise ValueError(
+            f"Unknown delivery mode {mode!r}; expected one of {DELIVERY_MODES}."
+        )
+    return mode
+
+
+def pending_articles_stmt(
+    user_ids: Optional[Iterable[int]] = None, mode: str = DELIVERY_MODE
+):
+    """
+    Builds the SELECT returning (user_id, Article) for every undelivered
+    article from each active user's subscribed sources, newest first per user.
+    Optionally restricted to ``user_ids``.
+    """
+    _check_mode(mode)
+
+    # Articles are linked to sources by name, and several subscribed sources
+    # can share a name (e.g. BBC News / World and / UK), hence DISTINCT.
+    subscribed = (
+        select(UserSubscription.user_id, Source.source_name)
+        .join(Source, Source.id == UserSubscription.source_id)
+        .join(User, User.id == UserSubscription.user_id)
+        .where(User.active == True)
+        .distinct()
+    )
+    if user_ids is not None:
+        subscribed = subscribed.where(UserSubscription.user_id.in_(list(user_ids)))
+    subscribed = subscribed.subquery("subscribed")
+
+    already_delivered = exists().where(
+        UserDelivery.user_id == subscribed.c.user_id,
+        UserDelivery.article_id == Article.id,
+    )
+
+    stmt = (
+        select(subscribed.c.user_id, Article)
+        .join(Article, Article.source == subscribed.c.source_name)
+        .where(~already_delivered)
+    )
+
+    if mode == "watermark":
+        # A correlated lookup rather than an outer join, so the mark is known
+        # before news_articles is read and bounds a (source, id) range search.
+        mark = (
+            select(UserWatermark.last_article_id)
+            .where(UserWatermark.user_id == subscribed.c.user_id)
+            .scalar_subquery()
+        )
+        stmt = stmt.where(Article.id > func.coalesce(mark, 0))
+
+    return stmt.order_by(subscribed.c.user_id, Article.id.desc())
+
+
+def load_pending_articles(
+    session: Session,
+    user_ids: Optional[Iterable[int]] = None,
+    mode: str = DELIVERY_MODE,
+) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Returns {user_id: [article_dict, ...]} of undelivered articles for all
+    active users (or just ``user_ids``, queried USER_ID_BATCH at a time),
+    newest first.  Each dict is Article.to_dict() plus the article "id";
+    articles shared by several users are the same dict object.  Users with
+    nothing pending are absent.
+    """
+    if user_ids is None:
+        batches = [None]
+    else:
+        user_ids = list(user_ids)
+        batches = [
+            user_ids[start : start + USER_ID_BATCH]
+            for start in range(0, len(user_ids), USER_ID_BATCH)
+        ]
+
+    pending = defaultdict(list)
+    as_dict = {}
+    for batch in batches:
+        for user_id, article in session.execute(pending_articles_stmt(batch, mode)):
+            if article.id not in as_dict:
+                as_dict[article.id] = {**article.to_dict(), "id": article.id}
+            pending[user_id].append(as_dict[article.id])
+
+    logger.debug(
+        f"Pending articles ({mode}): {sum(len(a) for a in pending.values())} "
+        f"across {len(pending)} user(s)."
+    )
+    return dict(pending)
+
+
+def record_deliveries(
+    session: Session,
+    user_id: int,
+    article_ids: List[int],
+    mode: str = DELIVERY_MODE,
+) -> None:
+    """
+    Marks articles as delivered to a user (caller commits).
+
+    In watermark mode ``article_ids`` must be the user's complete pending set,
+    as returned by load_pending_articles: the mark moves up to the newest of
+    them, which covers every older article as well.
+    """
+    _check_mode(mode)
+    if not article_ids:
+        return
+
+    if mode == "rows":
+        session.add_all(
+            UserDelivery(user_id=user_id, article_id=article_id)
+            for article_id in article_ids
+        )
+        return
+
+    newest = max(article_ids)
+    watermark = session.get(UserWatermark, user_id)
+    if watermark is None:
+        session.add(UserWatermark(user_id=user_id, last_article_id=newest))
+    elif newest > watermark.last_article_id:
+        watermark.last_article_id = newest
+
+
+def record_delivery_run(
+    session: Session,
+    user_ids: Optional[List[int]],
+    when: Optional[datetime] = None,
+) -> None:
+    """
+    Stamps User.last_delivered_at for users whose digest run has happened
+    (caller commits); the daemon schedules each user's next run from it.
+    ``user_ids`` None stamps every active user.
+    """
+    when = when or datetime.now(timezone.utc)
+    if user_ids is None:
+        session.execute(
+            update(User).where(User.active == True).values(last_delivered_at=when)
+        )
+        return
+    for start in range(0, len(user_ids), USER_ID_BATCH):
+        batch = user_ids[start : start + USER_ID_BATCH]
+        session.execute(
+            update(User).where(User.id.in_(batch)).values(last_delivered_at=when)
+        )
+
+
+def subscription_signatures_stmt():
+    """SELECT (user_id, source_name) for every active user's subscriptions."""
+    return (
+        select(UserSubscription.user_id, Source.source_name)
+        .join(Source, Source.id == UserSubscription.source_id)
+        .join(User, User.id == UserSubscription.user_id)
+        .where(User.active == True)
+    )
+
+
+def users_with_exceptions_stmt():
+    """
+    SELECT the ids of active users with user_deliveries rows above their
+    watermark.  Driven from users so each probe is an index range search on
+    (user_id, article_id) rather than a scan of the delivery table.
+    """
+    mark = (
+        select(UserWatermark.last_article_id)
+        .where(UserWatermark.user_id == User.id)
+        .correlate(User)
+        .scalar_subquery()
+    )
+    above_mark = exists().where(
+        UserDelivery.user_id == User.id,
+        UserDelivery.article_id > func.coalesce(mark, 0),
+    )
+    return select(User.id).where(User.active == True, above_mark)
+
+
+def _subscription_signatures(session: Session) -> Dict[int, tuple]:
+    """Sorted tuple of subscribed source names per active user."""
+    names = defaultdict(set)
+    for user_id, source_name in session.execute(subscription_signatures_stmt()):
+        names[user_id].add(source_name)
+    return {user_id: tuple(sorted(n)) for user_id, n in names.items()}
+
+
+def _users_with_exceptions(session: Session) -> set:
+    """Users with user_deliveries rows above their watermark."""
+    return {user_id for (user_id,) in session.execute(users_with_exceptions_stmt())}
+
+
+def build_cohorts(
+    session: Session,
+    users: List[User],
+    mode: str = DELIVERY_MODE,
+    user_ids: Optional[List[int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Groups users who would receive an identical digest.  Returns a list of
+    {"timezone": str, "articles": [article_dict, ...], "users": [User, ...]},
+    so each cohort's pending list and body only need computing once.
+    ``user_ids`` is the filter ``users`` were loaded with, None when they are
+    every active user (so no id list needs binding).
+
+    watermark mode: cohorts are keyed by (subscription-set signature,
+        watermark, timezone); pending articles are fetched once per cohort,
+        for all cohorts in one query.  Users with exception rows above their
+        mark get a cohort of their own.
+    rows mode: delivery state is the set of delivered rows, so the pending
+        list itself (from one batched query) is the key, with the timezone.
+    """
+    _check_mode(mode)
+    cohorts: Dict[tuple, Dict[str, Any]] = {}
+
+    if mode == "rows":
+        pending_by_user = load_pending_articles(session, user_ids, mode=mode)
+        for user in users:
+            articles = pending_by_user.get(user.id, [])
+            key = (tuple(a["id"] for a in articles), user.timezone)
+            cohort = cohorts.setdefault(
+                key, {"timezone": user.timezone, "articles": articles, "users": []}
+            )
+            cohort["users"].append(user)
+    else:
+        signatures = _subscription_signatures(session)
+        marks = {
+            w.user_id: w.last_article_id for w in session.query(UserWatermark).all()
+        }
+        exceptional = _users_with_exceptions(session)
+
+        representatives = {}
+        for user in users:
+            if user.id in exceptional:
+                key = ("user", user.id)
+            else:
+                signature = signatures.get(user.id, ())
+                key = (signature, marks.get(user.id, 0), user.timezone)
+            if key not in cohorts:
+                cohorts[key] = {"timezone": user.timezone, "articles": [], "users": []}
+                representatives[user.id] = key
+            cohorts[key]["users"].append(user)
+
+        pending = load_pending_articles(session, list(representatives), mode=mode)
+        for user_id, key in representatives.items():
+            cohorts[key]["articles"] = pending.get(user_id, [])
+
+    logger.info(f"Grouped {len(users)} user(s) into {len(cohorts)} cohort(s).")
+    return list(cohorts.values())
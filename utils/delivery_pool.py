@@ -0,0 +1,251 @@
+"""
+Parallel, rate-limited email delivery.
+
+Delivery jobs (one per recipient) are grouped into chunks of up to
+``chunk_size`` messages; each chunk is one Gmail batch request sent by a
+worker thread.  Before sending, a worker takes one token per message from a
+process-wide TokenBucket matched to Gmail's quotas.  Messages that fail
+with a 429 or 5xx are retried with jittered exponential backoff.  Each
+worker then records the confirmed deliveries in its own session, together
+with the day's send count (email_send_counts), and commits them, so a crash
+never marks an unsent email as delivered and the daily quota survives
+restarts.
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from googleapiclient.errors import HttpError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from db import get_session
+from db.models import EmailSendCount
+from utils import metrics
+from utils.rate_limit import QuotaExhausted, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+WORKERS = 4
+CHUNK_SIZE = 10  # messages per Gmail batch request from a worker
+# messages.send costs 100 of the 250 quota units/user/second; a consumer
+# Gmail account may send 500 messages a day (2000 on Workspace).
+SEND_RATE = 2.0  # messages per second
+SEND_BURST = 10
+DAILY_SEND_LIMIT = 500
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0  # seconds
+BACKOFF_CAP = 60.0  # seconds
+
+
+_limiter: Optional[TokenBucket] = None
+_limiter_lock = threading.Lock()
+
+
+def _utc_day() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def sends_today(session: Session) -> int:
+    """Emails recorded as sent so far today (UTC)."""
+    count = session.get(EmailSendCount, _utc_day())
+    return count.sent if count is not None else 0
+
+
+def _count_sends(session: Session, sent: int) -> None:
+    """Adds ``sent`` to today's send count (caller commits)."""
+    stmt = sqlite_insert(EmailSendCount).values(day=_utc_day(), sent=sent)
+    session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["day"], set_={"sent": EmailSendCount.sent + sent}
+        )
+    )
+
+
+def get_gmail_limiter() -> TokenBucket:
+    """
+    Returns the process-wide token bucket matched to the Gmail sending quotas
+    above, creating it on first use seeded with today's recorded sends.
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            session = get_session()
+            try:
+                used = sends_today(session)
+            finally:
+                session.close()
+            _limiter = TokenBucket(
+                SEND_RATE,
+                burst=SEND_BURST,
+                daily_limit=DAILY_SEND_LIMIT,
+                used_today=used,
+            )
+            logger.debug(f"Gmail quota: {used}/{DAILY_SEND_LIMIT} sent today.")
+        return _limiter
+
+
+def _is_retryable(error: Any) -> bool:
+    if isinstance(error, HttpError):
+        return error.resp.status == 429 or error.resp.status >= 500
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+def _backoff(attempt: int) -> float:
+    """Full-jitter exponential backoff for the given (1-based) attempt."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt))
+
+
+def _send_chunk(
+    chunk: List[Dict[str, Any]],
+    send_batch: Callable[[List[Dict[str, str]]], List[Any]],
+    limiter: TokenBucket,
+) -> List[Any]:
+    """
+    Sends one chunk, retrying transient per-message failures.  If the daily
+    quota runs out, the messages not yet sent get the QuotaExhausted error as
+    their outcome and the outcomes collected so far are returned.
+    """
+    outcomes: List[Any] = [None] * len(chunk)
+    todo = list(range(len(chunk)))
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            limiter.acquire(len(todo))
+        except QuotaExhausted as e:
+            for index in todo:
+                outcomes[index] = e
+            break
+        try:
+            with metrics.SEND_SECONDS.time():
+                results = send_batch([chunk[i]["message"] for i in todo])
+        except Exception as e:  # the whole batch request failed
+            results = [e] * len(todo)
+
+        retry = []
+        for index, result in zip(todo, results):
+            outcomes[index] = result
+            if _is_retryable(result):
+                retry.append(index)
+                metrics.SEND_ERRORS.inc(kind="transient")
+            elif isinstance(result, Exception) or result is None:
+                metrics.SEND_ERRORS.inc(kind="permanent")
+
+        if not retry or attempt == MAX_ATTEMPTS:
+            break
+        delay = _backoff(attempt)
+        logger.warning(
+            f"{len(retry)} message(s) hit a transient error; "
+            f"retrying in {delay:.1f}s (attempt {attempt + 1}/{MAX_ATTEMPTS})."
+        )
+        time.sleep(delay)
+        todo = retry
+
+    return outcomes
+
+
+def run_delivery_jobs(
+    jobs: Iterable[Dict[str, Any]],
+    send_batch: Callable[[List[Dict[str, str]]], List[Any]],
+    record: Callable[[Any, Dict[str, Any]], None],
+    workers: int = WORKERS,
+    chunk_size: int = CHUNK_SIZE,
+    limiter: Optional[TokenBucket] = None,
+) -> Dict[str, int]:
+    """
+    Sends every job's ``message`` and calls ``record(session, job)`` for each
+    confirmed send; the worker commits after recording its chunk.  ``jobs``
+    may be a generator — at most ``2 * workers`` chunks are built ahead of the
+    workers.  Jobs need a ``message`` and an ``email`` (for logging).
+
+    Returns counts of "sent", "failed" and "skipped" (not attempted because
+    the daily quota ran out).
+    """
+    limiter = limiter or get_gmail_limiter()
+    counts = {"sent": 0, "failed": 0, "skipped": 0}
+    counts_lock = threading.Lock()
+    quota_hit = threading.Event()
+    slots = threading.BoundedSemaphore(2 * max(1, workers))
+
+    def deliver(chunk: List[Dict[str, Any]]) -> None:
+        try:
+            if quota_hit.is_set():
+                with counts_lock:
+                    counts["skipped"] += len(chunk)
+                return
+            outcomes = _send_chunk(chunk, send_batch, limiter)
+
+            confirmed = []
+            quota_error = None
+            skipped = 0
+            for job, outcome in zip(chunk, outcomes):
+                if isinstance(outcome, QuotaExhausted):
+                    quota_error = outcome
+                    skipped += 1
+                elif isinstance(outcome, Exception) or outcome is None:
+                    logger.error(
+                        "Failed to send email to %s: %s", job["email"], outcome
+                    )
+                else:
+                    logger.debug("Message Id: %s sent to %s.", outcome, job["email"])
+                    confirmed.append(job)
+            if quota_error is not None and not quota_hit.is_set():
+                quota_hit.set()
+                logger.error(f"Gmail daily quota exhausted: {quota_error}")
+
+            if confirmed:
+                session = get_session()
+                try:
+                    for job in confirmed:
+                        record(session, job)
+                    _count_sends(session, len(confirmed))
+                    session.commit()
+                except Exception as e:
+                    session.rollback()
+                    logger.error(
+                        f"Sent {len(confirmed)} email(s) but failed to record "
+                        f"their deliveries: {e}"
+                    )
+                    raise
+                finally:
+                    session.close()
+
+            metrics.EMAILS_SENT.inc(len(confirmed))
+            with counts_lock:
+                counts["sent"] += len(confirmed)
+                counts["failed"] += len(chunk) - len(confirmed) - skipped
+                counts["skipped"] += skipped
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, workers), thread_name_prefix="deliver"
+    ) as executor:
+        futures = []
+        chunk = []
+        for job in jobs:
+            chunk.append(job)
+            if len(chunk) >= chunk_size:
+                slots.acquire()
+                futures.append(executor.submit(deliver, chunk))
+                chunk = []
+        if chunk:
+            slots.acquire()
+            futures.append(executor.submit(deliver, chunk))
+
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Delivery worker failed: {e}")
+
+    logger.info(
+        f"Delivery finished: {counts['sent']} sent, {counts['failed']} failed, "
+        f"{counts['skipped']} skipped (quota)."
+    )
+    return counts
@@ -2,35 +2,150 @@ import os
 import html
 import base64
 import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from zoneinfo import ZoneInfo
 from email.message import EmailMessage
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 
+from utils import metrics
+from utils.dedup import article_hash
+
 logger = logging.getLogger(__name__)
 
 SCOPES = ["https://www.googleapis.com/auth/gmail.send"]
+TOKEN_FILE = "token.json"
+CREDENTIALS_FILE = "credentials.json"
+REFRESH_MARGIN = timedelta(minutes=5)  # refresh this long before expiry
+BATCH_SIZE = 50  # messages per Gmail batch request (API limit is 100)
+CARD_CACHE_SIZE = 20000  # rendered (article, timezone) cards kept in memory
+
+
+class GmailClient:
+    """
+    Long-lived, thread-safe Gmail API client.
+
+    Credentials are read from token.json once and kept in memory; they are
+    refreshed (and token.json rewritten) only when they are within
+    REFRESH_MARGIN of expiring.  The discovery client is built once per
+    thread, since the underlying httplib2 connection is not thread-safe.
+    """
+
+    def __init__(
+        self, token_file: str = TOKEN_FILE, credentials_file: str = CREDENTIALS_FILE
+    ):
+        self.token_file = token_file
+        self.credentials_file = credentials_file
+        self._creds = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _needs_refresh(self) -> bool:
+        if not self._creds.valid:
+            return True
+        if self._creds.expiry is None:
+            return False
+        # google-auth stores expiry as a naive UTC datetime
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return self._creds.expiry - now <= REFRESH_MARGIN
+
+    def credentials(self) -> Credentials:
+        """Returns cached credentials, refreshing them shortly before expiry."""
+        with self._lock:
+            if self._creds is None and os.path.exists(self.token_file):
+                self._creds = Credentials.from_authorized_user_file(
+                    self.token_file, SCOPES
+                )
+
+            if self._creds is None or (
+                self._needs_refresh() and not self._creds.refresh_token
+            ):
+                flow = InstalledAppFlow.from_client_secrets_file(
+                    self.credentials_file, SCOPES
+                )
+                self._creds = flow.run_local_server(port=0)
+                self._save_token()
+            elif self._needs_refresh():
+                logger.debug("Refreshing Gmail API credentials.")
+                self._creds.refresh(Request())
+                self._save_token()
+
+            return self._creds
+
+    def _save_token(self) -> None:
+        with open(self.token_file, "w") as token:
+            token.write(self._creds.to_json())
+
+    def service(self):
+        """Returns this thread's Gmail API service, building it on first use."""
+        creds = self.credentials()
+        service = getattr(self._local, "service", None)
+        if service is None:
+            service = build("gmail", "v1", credentials=creds, cache_discovery=False)
+            self._local.service = service
+        return service
+
+    def send(self, message: Dict[str, str]) -> str:
+        """Sends one encoded message ({"raw": ...}) and returns its message id."""
+        result = (
+            self.service().users().messages().send(userId="me", body=message).execute()
+        )
+        return result["id"]
+
+    def send_batch(self, messages: List[Dict[str, str]]) -> List[Any]:
+        """
+        Sends messages through the Gmail batch endpoint, BATCH_SIZE per HTTP
+        request.  Returns one entry per message, in order: the message id on
+        success or the exception raised for that message.
+        """
+        outcomes: List[Any] = [None] * len(messages)
+
+        def on_response(request_id, response, exception):
+            index = int(request_id)
+            outcomes[index] = exception if exception is not None else response["id"]
+
+        service = self.service()
+        for start in range(0, len(messages), BATCH_SIZE):
+            batch = service.new_batch_http_request(callback=on_response)
+            for index in range(start, min(start + BATCH_SIZE, len(messages))):
+                batch.add(
+                    service.users().messages().send(userId="me", body=messages[index]),
+                    request_id=str(index),
+                )
+            self.credentials()  # make sure the token outlives the batch
+            batch.execute()
+        return outcomes
+
+
+_client: Optional[GmailClient] = None
+_client_lock = threading.Lock()
+
+
+def get_gmail_client() -> GmailClient:
+    """Returns the process-wide GmailClient, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GmailClient()
+        return _client
 
 
 def _get_gmail_service():
     """Authenticates and returns a Gmail API service instance."""
-    creds = None
-    if os.path.exists("token.json"):
-        creds = Credentials.from_authorized_user_file("token.json", SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open("token.json", "w") as token:
-            token.write(creds.to_json())
-    return build("gmail", "v1", credentials=creds, cache_discovery=False)
+    return get_gmail_client().service()
+
+
+@lru_cache(maxsize=16384)
+def _parse_iso(raw: str) -> datetime:
+    """Parses an ISO 8601 timestamp (cached — the same values recur per recipient)."""
+    return datetime.fromisoformat(raw.replace("Z", "+00:00"))
 
 
 def _render_article_card(a: Dict[str, Any], cet: ZoneInfo) -> str:
@@ -39,7 +154,7 @@ def _render_article_card(a: Dict[str, Any], cet: ZoneInfo) -> str:
     source = html.escape(a.get("source", "Unknown"))
     last_modified_raw = a.get("lastModified", "")
     if last_modified_raw:
-        utc_dt = datetime.fromisoformat(last_modified_raw.replace("Z", "+00:00"))
+        utc_dt = _parse_iso(last_modified_raw)
         cet_dt = utc_dt.astimezone(cet)
         last_modified_cet = cet_dt.strftime("%Y %B %-d at %H:%M %Z")
     else:
@@ -56,13 +171,65 @@ def _render_article_card(a: Dict[str, Any], cet: ZoneInfo) -> str:
     )
 
 
+class CardCache:
+    """
+    Bounded LRU of rendered article cards keyed by (article hash, timezone),
+    shared across recipients so each article is rendered once per timezone.
+    """
+
+    def __init__(self, maxsize: int = CARD_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._cards: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def render(self, article: Dict[str, Any], tz: ZoneInfo) -> str:
+        """Returns the article's HTML card for ``tz``, rendering it on a miss."""
+        key = (article.get("hash") or article_hash(article), tz.key)
+        with self._lock:
+            card = self._cards.get(key)
+            if card is not None:
+                self._cards.move_to_end(key)
+                self.hits += 1
+                return card
+            self.misses += 1
+
+        card = _render_article_card(article, tz)
+
+        with self._lock:
+            self._cards[key] = card
+            if len(self._cards) > self.maxsize:
+                self._cards.popitem(last=False)
+                self.evictions += 1
+        return card
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._cards),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cards.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+card_cache = CardCache()
+
+
 def _get_article_dt(article: Dict[str, Any]) -> datetime:
     """Parses an article's lastModified into a timezone-aware UTC datetime."""
     raw = article.get("lastModified", "")
     if not raw:
         return datetime.min.replace(tzinfo=timezone.utc)
     try:
-        return datetime.fromisoformat(raw.replace("Z", "+00:00"))
+        return _parse_iso(raw)
     except ValueError:
         return datetime.min.replace(tzinfo=timezone.utc)
 
@@ -103,45 +270,59 @@ def _bucket_articles(articles: List[Dict[str, Any]], now: datetime) -> List[tupl
     return [(heading, items) for heading, items in buckets.items() if items]
 
 
-def send_email_for_user(
+def render_digest_body(articles: List[Dict[str, Any]], user_timezone: str) -> str:
+    """
+    Renders the recipient-independent part of a digest: the heading and the
+    time-bucketed article cards.  Users in the same cohort share it.
+    """
+    with metrics.RENDER_SECONDS.time():
+        tz = ZoneInfo(user_timezone)
+        now = datetime.now(timezone.utc)
+
+        sections = _bucket_articles(articles, now)
+
+        html_sections = []
+        for heading, section_articles in sections:
+            cards = "".join(card_cache.render(a, tz) for a in section_articles)
+            html_sections.append(
+                f'<h2 style="color: #005689; border-bottom: 2px solid #005689; padding-bottom: 6px; margin-top: 30px;">'
+                f"{heading} ({len(section_articles)})</h2>"
+                f"{cards}"
+            )
+
+    return (
+        f'<h1 style="color: #005689;">Your New Articles ({len(articles)})</h1>'
+        f'{"".join(html_sections)}'
+    )
+
+
+def build_email_for_user(
     articles: List[Dict[str, Any]],
     sender: str,
     recipient: str,
     user_name: str = "",
     user_timezone: str = "Europe/Berlin",
-) -> None:
+    body_html: Optional[str] = None,
+) -> Dict[str, str]:
     """
-    Sends an HTML email to a single user with their pending articles.
+    Builds the HTML email for a single user with their pending articles,
+    encoded for the Gmail API ({"raw": ...}).
     Uses the user's preferred timezone for date formatting.
     Articles are grouped into time-based sections: last hour, last 6 hours, last 24 hours.
-    """
-    if not articles:
-        return
-
-    service = _get_gmail_service()
 
+    Pass a body_html from render_digest_body() to reuse an already rendered
+    digest; only the greeting and headers are then built per recipient.
+    """
     subject = f"New Articles for {user_name} ({len(articles)})"
-    tz = ZoneInfo(user_timezone)
-    now = datetime.now(timezone.utc)
-
-    sections = _bucket_articles(articles, now)
-
-    html_sections = []
-    for heading, section_articles in sections:
-        cards = "".join(_render_article_card(a, tz) for a in section_articles)
-        html_sections.append(
-            f'<h2 style="color: #005689; border-bottom: 2px solid #005689; padding-bottom: 6px; margin-top: 30px;">'
-            f"{heading} ({len(section_articles)})</h2>"
-            f"{cards}"
-        )
+    if body_html is None:
+        body_html = render_digest_body(articles, user_timezone)
 
     greeting = f"Hi {user_name}," if user_name else "Hi,"
 
     html_body = (
         f'<html><body style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">'
         f'<p style="color: #333;">{greeting}</p>'
-        f'<h1 style="color: #005689;">Your New Articles ({len(articles)})</h1>'
-        f'{"".join(html_sections)}'
+        f"{body_html}"
         f"</body></html>"
     )
 
@@ -155,13 +336,32 @@ def send_email_for_user(
     message["Subject"] = subject
 
     encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
-    create_message = {"raw": encoded_message}
+    return {"raw": encoded_message}
+
+
+def send_email_for_user(
+    articles: List[Dict[str, Any]],
+    sender: str,
+    recipient: str,
+    user_name: str = "",
+    user_timezone: str = "Europe/Berlin",
+) -> Optional[str]:
+    """
+    Sends an HTML email to a single user with their pending articles.
+    Returns the Gmail message id, or None if nothing was sent.
+    """
+    if not articles:
+        return None
+
+    create_message = build_email_for_user(
+        articles, sender, recipient, user_name, user_timezone
+    )
 
     logger.info(f"Sending Gmail API email to {recipient}...")
     try:
-        send_result = (
-            service.users().messages().send(userId="me", body=create_message).execute()
-        )
-        logger.info(f"Message Id: {send_result['id']} sent successfully!")
+        message_id = get_gmail_client().send(create_message)
+        logger.info(f"Message Id: {message_id} sent successfully!")
+        return message_id
     except Exception as error:
         logger.error(f"Failed to send Gmail API email: {error}")
+        return None
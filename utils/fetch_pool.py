@@ -0,0 +1,155 @@
+"""
+Runs per-source fetch jobs concurrently on a bounded thread pool.
+
+Each job is a dict with a display ``name``, the ``url`` it talks to (used for
+the per-host cap) and a zero-argument ``fetch`` callable returning a list of
+standard article dicts.  Jobs are dispatched only while their host has a free
+slot, so a batch of feeds on the same domain never exceeds ``max_per_host``
+requests in flight.
+"""
+
+import logging
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 8  # parallel fetches overall
+MAX_PER_HOST = 2  # parallel fetches against a single host
+SOURCE_TIMEOUT = 20.0  # seconds a single source may take once started
+OVERALL_TIMEOUT = 90.0  # seconds for the whole fetch phase
+
+
+def _host(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+def _timed_call(
+    fetch: Callable[[], List[Dict[str, Any]]], started: Dict[int, float], idx: int
+):
+    """Runs a fetch callable, recording its start time for deadline tracking."""
+    started[idx] = time.monotonic()
+    return fetch()
+
+
+def run_fetch_jobs(
+    jobs: List[Dict[str, Any]],
+    max_workers: int = MAX_WORKERS,
+    max_per_host: int = MAX_PER_HOST,
+    source_timeout: float = SOURCE_TIMEOUT,
+    overall_timeout: float = OVERALL_TIMEOUT,
+) -> List[Dict[str, Any]]:
+    """
+    Executes fetch jobs concurrently and returns one result dict per job,
+    in the same order as ``jobs``.
+
+    Each result carries ``name``, ``url``, ``articles``, ``elapsed`` (seconds,
+    or None if the job never started), ``error`` (str or None) and
+    ``timed_out``.  A job that overruns ``source_timeout``, or is still queued
+    or running when ``overall_timeout`` expires, is abandoned with no articles;
+    its worker thread is left to finish in the background.
+    """
+    results = [
+        {
+            "name": job["name"],
+            "url": job.get("url", ""),
+            "articles": [],
+            "elapsed": None,
+            "error": None,
+            "timed_out": False,
+        }
+        for job in jobs
+    ]
+    if not jobs:
+        return results
+
+    max_workers = max(1, max_workers)
+    max_per_host = max(1, max_per_host)
+
+    queued = defaultdict(deque)  # host -> job indexes waiting for a slot
+    for idx, job in enumerate(jobs):
+        queued[_host(job.get("url", ""))].append(idx)
+
+    in_flight_per_host = defaultdict(int)
+    started: Dict[int, float] = {}
+    futures = {}  # future -> job index
+    abandoned = set()
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+    deadline = time.monotonic() + overall_timeout
+
+    def dispatch():
+        for host, waiting in queued.items():
+            while waiting and in_flight_per_host[host] < max_per_host:
+                idx = waiting.popleft()
+                in_flight_per_host[host] += 1
+                future = executor.submit(_timed_call, jobs[idx]["fetch"], started, idx)
+                futures[future] = idx
+
+    try:
+        dispatch()
+        while futures:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if set(futures.values()) <= abandoned and not any(queued.values()):
+                break  # only abandoned stragglers left
+
+            # Wake up for whichever comes first: a completion, the overall
+            # deadline, or the earliest per-source deadline.
+            wake_at = deadline
+            for future, idx in futures.items():
+                if idx in started and idx not in abandoned:
+                    wake_at = min(wake_at, started[idx] + source_timeout)
+            done, _ = wait(
+                list(futures),
+                timeout=max(0.0, wake_at - now),
+                return_when=FIRST_COMPLETED,
+            )
+
+            for future in done:
+                idx = futures.pop(future)
+                in_flight_per_host[_host(results[idx]["url"])] -= 1
+                if idx in abandoned:
+                    continue
+                results[idx]["elapsed"] = time.monotonic() - started.get(idx, now)
+                try:
+                    results[idx]["articles"] = future.result() or []
+                except Exception as e:
+                    results[idx]["error"] = str(e)
+
+            now = time.monotonic()
+            for future, idx in futures.items():
+                if (
+                    idx in started
+                    and idx not in abandoned
+                    and now - started[idx] >= source_timeout
+                ):
+                    # Keep the host slot occupied until the thread really
+                    # finishes so the per-host cap stays honest.
+                    abandoned.add(idx)
+                    result = results[idx]
+                    result["timed_out"] = True
+                    result["elapsed"] = now - started[idx]
+                    result["error"] = f"exceeded {source_timeout:.0f}s deadline"
+
+            dispatch()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    # Anything still queued or running when the overall deadline hit.
+    for idx, result in enumerate(results):
+        if result["elapsed"] is None or (
+            idx in futures.values() and idx not in abandoned
+        ):
+            result["timed_out"] = True
+            if idx in started:
+                result["elapsed"] = time.monotonic() - started[idx]
+            result["error"] = (
+                result["error"] or f"exceeded {overall_timeout:.0f}s fetch deadline"
+            )
+
+    return results
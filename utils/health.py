@@ -0,0 +1,148 @@
+"""
+Per-source fetch health and a circuit breaker.
+
+After every fetch the outcome, latency and response size are recorded on
+the source's SourceHealth row.  After FAILURE_THRESHOLD consecutive
+failures the circuit opens and the source is skipped until retry_at.  Then
+a single half-open probe is let through: success closes the circuit, and
+failure opens it again with the cooldown doubled (capped at MAX_COOLDOWN).
+
+Report with `python -m db.source_health`.
+"""
+
+import logging
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from db import get_session
+from db.models import SourceHealth
+
+logger = logging.getLogger(__name__)
+
+FAILURE_THRESHOLD = 3  # consecutive failures that open the circuit
+BASE_COOLDOWN = 300  # seconds an opened circuit stays open
+MAX_COOLDOWN = 21600  # seconds
+LATENCY_WINDOW = 50  # recent fetches used for p50 / p95
+
+CLOSED, OPEN = "closed", "open"
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """SQLite returns naive datetimes; they are stored in UTC."""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of ``values``."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(pct / 100 * len(ordered))) - 1]
+
+
+def load_health(session: Session, source_ids: Iterable[int]) -> Dict[int, SourceHealth]:
+    """Returns {source_id: SourceHealth} for those sources that have a row."""
+    stmt = select(SourceHealth).where(SourceHealth.source_id.in_(list(source_ids)))
+    return {health.source_id: health for health in session.scalars(stmt)}
+
+
+def allow_fetch(health: Optional[SourceHealth], now: Optional[datetime] = None) -> bool:
+    """
+    Whether a source may be fetched now: its circuit is closed, or open with
+    retry_at passed (half-open — the fetch is a probe).
+    """
+    if health is None or health.circuit_state != OPEN:
+        return True
+    now = now or datetime.now(timezone.utc)
+    return health.retry_at is None or _as_utc(health.retry_at) <= now
+
+
+def record_fetch(
+    health: SourceHealth,
+    error: Optional[str],
+    elapsed: Optional[float],
+    size: Optional[int],
+    now: Optional[datetime] = None,
+) -> None:
+    """Updates ``health`` with the outcome of one fetch (caller commits)."""
+    now = now or datetime.now(timezone.utc)
+    health.fetches = (health.fetches or 0) + 1
+
+    if elapsed is not None:
+        recent = [float(v) for v in (health.recent_latencies or "").split()]
+        recent = (recent + [elapsed])[-LATENCY_WINDOW:]
+        health.recent_latencies = " ".join(f"{v:.3f}" for v in recent)
+        health.latency_p50 = _percentile(recent, 50)
+        health.latency_p95 = _percentile(recent, 95)
+
+    if size is not None:
+        health.bytes_last = size
+        health.bytes_total = (health.bytes_total or 0) + size
+
+    if error is None:
+        if health.circuit_state != CLOSED:
+            logger.info(f"Source {health.source_id}: circuit closed after probe.")
+        health.last_success_at = now
+        health.consecutive_failures = 0
+        health.circuit_state = CLOSED
+        health.retry_at = None
+        return
+
+    health.failures = (health.failures or 0) + 1
+    health.consecutive_failures = (health.consecutive_failures or 0) + 1
+    health.last_failure_at = now
+    health.last_error = error
+
+    # A failed half-open probe also lands here: an open circuit already
+    # has at least FAILURE_THRESHOLD consecutive failures.
+    if health.consecutive_failures >= FAILURE_THRESHOLD:
+        extra = health.consecutive_failures - FAILURE_THRESHOLD
+        cooldown = min(MAX_COOLDOWN, BASE_COOLDOWN * 2 ** max(0, extra))
+        health.circuit_state = OPEN
+        health.retry_at = now + timedelta(seconds=cooldown)
+        logger.warning(
+            f"Source {health.source_id}: circuit open after "
+            f"{health.consecutive_failures} consecutive failure(s); "
+            f"next probe in {cooldown}s."
+        )
+
+
+def save_fetch_health(results: List[Dict[str, Any]]) -> None:
+    """
+    Records one fetch outcome per source.  Each result needs "source_id",
+    "error" (str or None), "elapsed" (seconds or None) and "bytes".
+    """
+    if not results:
+        return
+
+    session = get_session()
+    try:
+        existing = load_health(session, [r["source_id"] for r in results])
+        for result in results:
+            health = existing.get(result["source_id"])
+            if health is None:
+                health = SourceHealth(
+                    source_id=result["source_id"],
+                    consecutive_failures=0,
+                    fetches=0,
+                    failures=0,
+                    bytes_total=0,
+                    circuit_state=CLOSED,
+                )
+                session.add(health)
+            record_fetch(
+                health, result["error"], result["elapsed"], result.get("bytes")
+            )
+        session.commit()
+        logger.debug(f"Saved fetch health for {len(results)} sources.")
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Failed to save fetch health: {e}")
+    finally:
+        session.close()
@@ -0,0 +1,364 @@
+"""
+In-process metrics: labelled counters and histograms for each pipeline
+stage, exported in the Prometheus text format or as a JSON summary.
+
+    from utils import metrics
+    metrics.FETCH_SECONDS.observe(elapsed, source="BBC News / World")
+    with metrics.RENDER_SECONDS.time():
+        ...
+
+Exports:
+    render_prometheus()   text exposition format (version 0.0.4)
+    write_textfile(path)  the same, written atomically (node_exporter's
+                          textfile collector, or any scraper reading a file)
+    serve(port)           /metrics on a background HTTP server (daemon mode)
+    summary()             a JSON-serialisable dict, logged after one-shot runs
+
+No client library is needed; all metrics live in the module-level REGISTRY.
+"""
+
+import bisect
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+def _label_key(labelnames: Sequence[str], labels: Dict[str, Any]) -> Tuple[str, ...]:
+    if set(labels) != set(labelnames):
+        raise ValueError(f"expected labels {tuple(labelnames)}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: Sequence[str], key: Tuple[str, ...], **extra) -> str:
+    pairs = list(zip(labelnames, key)) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Monotonic count, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def total(self) -> float:
+        with self._lock:
+            return sum(self._values.values())
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value:g}"
+            for key, value in items
+        ]
+
+    def snapshot(self) -> Any:
+        with self._lock:
+            if not self.labelnames:
+                return self._values.get((), 0)
+            return {"/".join(key): value for key, value in sorted(self._values.items())}
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, split by labels."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts (+Inf last), count, sum, max]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [
+                    [0] * (len(self.buckets) + 1),
+                    0,
+                    0.0,
+                    0.0,
+                ]
+            series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+            series[3] = max(series[3], value)
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observes the wall-clock seconds spent in the ``with`` block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(
+                (k, [list(s[0]), s[1], s[2]]) for k, s in self._series.items()
+            )
+        lines = []
+        for key, (counts, count, total) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                le = bound if bound == "+Inf" else f"{bound:g}"
+                labels = _format_labels(self.labelnames, key, le=le)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total:g}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            items = sorted(self._series.items())
+        result = {}
+        for key, (_, count, total, largest) in items:
+            result["/".join(key) or "all"] = {
+                "count": count,
+                "sum": round(total, 6),
+                "mean": round(total / count, 6) if count else 0,
+                "max": round(largest, 6),
+            }
+        return result
+
+
+class Registry:
+    """Holds metrics in registration order."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def metrics(self) -> List[Any]:
+        return list(self._metrics.values())
+
+    def reset(self) -> None:
+        for metric in self._metrics.values():
+            metric.reset()
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = LATENCY_BUCKETS,
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# --- Pipeline metrics ---
+
+STAGE_SECONDS = histogram(
+    "amalgamator_stage_seconds", "Duration of a pipeline stage.", ["stage"]
+)
+
+FETCH_SECONDS = histogram(
+    "amalgamator_fetch_seconds", "Fetch latency per source.", ["source"]
+)
+FETCH_BYTES = counter(
+    "amalgamator_fetch_bytes_total", "Response bytes fetched per source.", ["source"]
+)
+FETCH_ERRORS = counter(
+    "amalgamator_fetch_errors_total", "Failed fetches per source.", ["source"]
+)
+ARTICLES_PARSED = counter(
+    "amalgamator_articles_parsed_total", "Articles parsed per source.", ["source"]
+)
+
+HTTP_REQUESTS = counter(
+    "amalgamator_http_requests_total", "HTTP requests per host.", ["host"]
+)
+HTTP_CONNECTIONS = counter(
+    "amalgamator_http_connections_total",
+    "New connections opened per host; the rest of the requests reused one.",
+    ["host"],
+)
+HTTP_WIRE_BYTES = counter(
+    "amalgamator_http_wire_bytes_total",
+    "Response bytes received per host, before content decoding.",
+    ["host"],
+)
+HTTP_BODY_BYTES = counter(
+    "amalgamator_http_body_bytes_total",
+    "Response bytes per host after gzip/deflate decoding.",
+    ["host"],
+)
+
+DEDUP_CANDIDATES = counter(
+    "amalgamator_dedup_candidates_total", "Articles checked for duplicates."
+)
+DEDUP_DUPLICATES = counter(
+    "amalgamator_dedup_duplicates_total", "Articles dropped as already seen."
+)
+
+DB_INSERT_SECONDS = histogram(
+    "amalgamator_db_insert_seconds", "Time to insert and commit new articles."
+)
+DB_INSERTED = counter("amalgamator_db_inserted_total", "Articles inserted.")
+
+PENDING_ARTICLES = histogram(
+    "amalgamator_pending_articles",
+    "Pending articles per user at delivery time.",
+    buckets=COUNT_BUCKETS,
+)
+RENDER_SECONDS = histogram(
+    "amalgamator_render_seconds", "Time to render one digest body."
+)
+
+SEND_SECONDS = histogram(
+    "amalgamator_send_batch_seconds", "Latency of one Gmail batch request."
+)
+EMAILS_SENT = counter("amalgamator_emails_sent_total", "Emails confirmed by Gmail.")
+SEND_ERRORS = counter(
+    "amalgamator_send_errors_total",
+    "Per-message send errors; kind is transient (retried) or permanent.",
+    ["kind"],
+)
+
+
+# --- Export ---
+
+
+def render_prometheus(registry: Registry = REGISTRY) -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in registry.metrics():
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path: str, registry: Registry = REGISTRY) -> None:
+    """Writes render_prometheus() to ``path`` atomically."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".metrics-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(render_prometheus(registry))
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def summary(registry: Registry = REGISTRY) -> Dict[str, Any]:
+    """
+    JSON-serialisable snapshot of every metric that has data, plus the
+    derived dedup hit ratio.
+    """
+    result = {}
+    for metric in registry.metrics():
+        snapshot = metric.snapshot()
+        if snapshot:
+            result[metric.name] = snapshot
+    candidates = DEDUP_CANDIDATES.total()
+    if candidates:
+        result["dedup_hit_ratio"] = round(DEDUP_DUPLICATES.total() / candidates, 4)
+    return result
+
+
+def log_summary(path: Optional[str] = None) -> Dict[str, Any]:
+    """Logs the stage timings and writes the full summary as JSON to ``path``."""
+    data = summary()
+    for stage, stats in data.get(STAGE_SECONDS.name, {}).items():
+        logger.info(f"Stage {stage}: {stats['sum']:.2f}s.")
+    if "dedup_hit_ratio" in data:
+        logger.info(f"Dedup hit ratio: {data['dedup_hit_ratio']:.1%}.")
+    if path:
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+        logger.info(f"Metrics summary written to {path}.")
+    return data
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serves /metrics from a daemon thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_port}/metrics")
+    return server
@@ -0,0 +1,99 @@
+"""
+Adaptive per-source polling.
+
+Each Source learns its publication rate from the number of new articles
+(after dedup) its fetches produce, kept as an exponentially weighted
+average in articles per hour.  The next poll is timed so that roughly
+TARGET_NEW_PER_POLL new articles are waiting, bounded by
+MIN_POLL_INTERVAL / MAX_POLL_INTERVAL.  Empty and failed fetches back off
+exponentially from the current interval instead.
+
+The state lives on the Source row (see POLL_FIELDS) and travels with the
+HTTP validators in each fetch job's ``state`` dict.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from db.models import Source
+
+logger = logging.getLogger(__name__)
+
+POLL_FIELDS = ("poll_interval", "publish_rate", "last_polled_at", "next_poll_at")
+
+MIN_POLL_INTERVAL = 300  # seconds
+MAX_POLL_INTERVAL = 86400  # seconds
+DEFAULT_POLL_INTERVAL = 900  # seconds, until a source has some history
+BACKOFF_FACTOR = 2.0  # interval multiplier after an empty or failed fetch
+TARGET_NEW_PER_POLL = 2.0  # new articles we'd like waiting at each poll
+RATE_SMOOTHING = 0.3  # weight of the newest sample in publish_rate
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """SQLite returns naive datetimes; they are stored in UTC."""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _clamp(seconds: float) -> int:
+    return int(min(MAX_POLL_INTERVAL, max(MIN_POLL_INTERVAL, seconds)))
+
+
+def due_sources_stmt(now: Optional[datetime] = None):
+    """SELECT active sources whose next poll is due (or never scheduled)."""
+    now = now or datetime.now(timezone.utc)
+    return select(Source).where(
+        Source.active == True,
+        or_(Source.next_poll_at.is_(None), Source.next_poll_at <= now),
+    )
+
+
+def next_poll_due(session: Session) -> Optional[datetime]:
+    """Earliest next_poll_at among active sources (None if none scheduled)."""
+    earliest = session.execute(
+        select(func.min(Source.next_poll_at)).where(Source.active == True)
+    ).scalar()
+    return _as_utc(earliest)
+
+
+def update_poll_state(
+    state: Dict[str, Any],
+    new_articles: int,
+    failed: bool = False,
+    now: Optional[datetime] = None,
+) -> None:
+    """
+    Updates a source's poll fields in ``state`` after a fetch that produced
+    ``new_articles`` new (deduplicated) articles, or failed.
+    """
+    now = now or datetime.now(timezone.utc)
+    interval = state.get("poll_interval") or DEFAULT_POLL_INTERVAL
+    last_polled = _as_utc(state.get("last_polled_at"))
+
+    if failed:
+        interval = _clamp(interval * BACKOFF_FACTOR)
+    else:
+        # A first poll has no window to measure against; count it as one
+        # default interval.
+        elapsed = (now - last_polled).total_seconds() if last_polled else interval
+        sample = new_articles / max(elapsed, 1.0) * 3600
+        rate = state.get("publish_rate")
+        if rate is None:
+            rate = sample
+        else:
+            rate = RATE_SMOOTHING * sample + (1 - RATE_SMOOTHING) * rate
+        state["publish_rate"] = rate
+        state["last_polled_at"] = now
+
+        if new_articles == 0 or rate <= 0:
+            interval = _clamp(interval * BACKOFF_FACTOR)
+        else:
+            interval = _clamp(TARGET_NEW_PER_POLL / rate * 3600)
+
+    state["poll_interval"] = interval
+    state["next_poll_at"] = now + timedelta(seconds=interval)
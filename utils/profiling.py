@@ -0,0 +1,183 @@
+"""
+Profiling mode for runs (``python main.py --profile``).
+
+Each stage runs inside Profiler.stage(name), which collects:
+
+    <stage>.prof       cProfile stats of the calling thread (orchestration,
+                       dedup, DB writes, rendering); open with pstats or
+                       snakeviz
+    <stage>.collapsed  wall-clock stack samples of *every* thread, including
+                       the fetch / delivery pool workers cProfile cannot see,
+                       in collapsed-stack format for flamegraph.pl/speedscope
+    tracemalloc        peak traced memory and the top allocation sites
+    SQL                statement counts and timings (db.track_statements)
+
+Profiler.report() writes summary.txt next to those files and logs it.
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List
+
+from db import StatementStats, track_statements
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = "profiles"
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+TOP_FUNCTIONS = 15
+TOP_STATEMENTS = 10
+TOP_ALLOCATIONS = 10
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}.{code.co_name}"
+
+
+class StackSampler:
+    """Samples every thread's stack on a background thread."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                # Pool threads are named e.g. "fetch_3"; group them by pool.
+                thread = names.get(ident, "thread")
+                prefix, _, suffix = thread.rpartition("_")
+                if prefix and suffix.isdigit():
+                    thread = prefix
+                self.samples[";".join([thread] + stack[::-1])] += 1
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: str) -> None:
+        with open(path, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """Collects per-stage profiles into ``output_dir``."""
+
+    def __init__(self, output_dir: str = None):
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.output_dir = output_dir or os.path.join(PROFILE_DIR, stamp)
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.stages: Dict[str, Dict[str, Any]] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        profile = cProfile.Profile()
+        statements = StatementStats()
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+        started = time.perf_counter()
+        try:
+            with track_statements(statements), StackSampler() as sampler:
+                profile.enable()
+                try:
+                    yield
+                finally:
+                    profile.disable()
+        finally:
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            allocations = tracemalloc.take_snapshot().statistics("lineno")
+            if started_tracing:
+                tracemalloc.stop()
+
+            prof_path = os.path.join(self.output_dir, f"{name}.prof")
+            profile.dump_stats(prof_path)
+            sampler.write(os.path.join(self.output_dir, f"{name}.collapsed"))
+            self.stages[name] = {
+                "elapsed": elapsed,
+                "stats": pstats.Stats(prof_path),
+                "statements": statements,
+                "peak_bytes": peak,
+                "allocations": allocations[:TOP_ALLOCATIONS],
+            }
+
+    def _stage_summary(self, name: str, stage: Dict[str, Any]) -> List[str]:
+        count, sql_seconds = stage["statements"].totals()
+        lines = [
+            f"=== {name}: {stage['elapsed']:.2f}s wall, "
+            f"peak traced memory {stage['peak_bytes'] / 2**20:.1f} MiB, "
+            f"{count} SQL statement(s) in {sql_seconds:.2f}s ===",
+            "",
+            f"Top {TOP_FUNCTIONS} functions by cumulative time (calling thread):",
+        ]
+        stream = io.StringIO()
+        stage["stats"].stream = stream
+        stage["stats"].sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        # Keep the table, drop pstats' preamble.
+        table = stream.getvalue().split("\n")
+        header = next(
+            (i for i, line in enumerate(table) if line.strip().startswith("ncalls")), 0
+        )
+        lines.extend(line for line in table[header:] if line.strip())
+
+        lines += ["", f"Slowest {TOP_STATEMENTS} SQL statements by total time:"]
+        for sql, calls, total, slowest in stage["statements"].slowest(TOP_STATEMENTS):
+            text = " ".join(sql.split())
+            lines.append(
+                f"  {total:8.3f}s  {calls:6d}x  max {slowest * 1000:7.1f}ms  "
+                f"{text[:160]}"
+            )
+
+        lines += ["", f"Top {TOP_ALLOCATIONS} allocation sites (live at stage end):"]
+        for stat in stage["allocations"]:
+            frame = stat.traceback[0]
+            lines.append(
+                f"  {stat.size / 1024:9.1f} KiB  {stat.count:7d} blocks  "
+                f"{frame.filename}:{frame.lineno}"
+            )
+        return lines + [""]
+
+    def report(self) -> str:
+        """Writes summary.txt, logs it and returns its path."""
+        lines = []
+        for name, stage in self.stages.items():
+            lines.extend(self._stage_summary(name, stage))
+        path = os.path.join(self.output_dir, "summary.txt")
+        with open(path, "w") as f:
+            f.write("\n".join(lines))
+        for line in lines:
+            logger.info(line)
+        logger.info(f"Profiles written to {self.output_dir}/")
+        return path
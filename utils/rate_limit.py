@@ -0,0 +1,93 @@
+"""
+Thread-safe token bucket used to keep API calls inside provider quotas.
+"""
+
+import threading
+import time
+from datetime import date, datetime, timezone
+from typing import Optional
+
+
+class QuotaExhausted(Exception):
+    """Raised when the bucket's daily allowance has been used up."""
+
+
+def _utc_today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+class TokenBucket:
+    """
+    Allows ``rate`` operations per second on average with bursts of up to
+    ``burst``, and at most ``daily_limit`` operations per UTC day (None for
+    no daily cap).  The bucket only counts its own operations, so
+    ``used_today`` seeds it with those already made today elsewhere, e.g.
+    by earlier runs.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float = 1.0,
+        daily_limit: Optional[int] = None,
+        used_today: int = 0,
+    ):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.daily_limit = daily_limit
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._day = _utc_today()
+        self._used_today = used_today
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        today = _utc_today()
+        if today != self._day:
+            self._day = today
+            self._used_today = 0
+
+    @property
+    def remaining_today(self) -> Optional[int]:
+        if self.daily_limit is None:
+            return None
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.daily_limit - self._used_today
+
+    def acquire(self, tokens: int = 1) -> None:
+        """
+        Blocks until ``tokens`` operations may proceed.  Requests larger than
+        the burst size are paid off gradually.  Raises QuotaExhausted if they
+        would exceed the daily limit.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if (
+                self.daily_limit is not None
+                and self._used_today + tokens > self.daily_limit
+            ):
+                raise QuotaExhausted(
+                    f"daily limit of {self.daily_limit} reached "
+                    f"({self._used_today} used)"
+                )
+            self._used_today += tokens
+
+        remaining = float(tokens)
+        while remaining > 0:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                take = min(remaining, self._tokens)
+                # Only take whole chunks once something is available, so
+                # concurrent callers interleave instead of starving.
+                if take >= min(remaining, 1.0):
+                    self._tokens -= take
+                    remaining -= take
+                    continue
+                wait = (min(remaining, 1.0) - self._tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,107 @@
+"""
+Due-time scheduling for the long-running daemon (``python main.py --daemon``).
+
+Work items are identified by a hashable key ("fetch", ("deliver", user_id))
+and kept in a heap ordered by their next due time, so the daemon only wakes
+when something is due.  Re-scheduling a key replaces its previous entry;
+replaced entries stay in the heap and are skipped when they surface.
+"""
+
+import heapq
+import itertools
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# User.delivery_schedule values and the gap between two digests.
+DELIVERY_INTERVALS = {
+    "hourly": timedelta(hours=1),
+    "6h": timedelta(hours=6),
+    "daily": timedelta(days=1),
+}
+DEFAULT_SCHEDULE = "daily"
+_warned_schedules = set()
+
+
+def delivery_interval(schedule: Optional[str]) -> timedelta:
+    """Interval for a User.delivery_schedule value; unknown values mean daily."""
+    if schedule not in DELIVERY_INTERVALS:
+        if schedule not in _warned_schedules:
+            _warned_schedules.add(schedule)
+            logger.warning(
+                f"Unknown delivery schedule {schedule!r}; using {DEFAULT_SCHEDULE!r}."
+            )
+        schedule = DEFAULT_SCHEDULE
+    return DELIVERY_INTERVALS[schedule]
+
+
+def next_delivery_at(
+    schedule: Optional[str], last_delivered_at: Optional[datetime]
+) -> datetime:
+    """
+    When a user's next digest is due (UTC).  Users never delivered to are due
+    immediately.  Naive timestamps (as SQLite returns them) are taken as UTC.
+    """
+    if last_delivered_at is None:
+        return datetime.now(timezone.utc)
+    if last_delivered_at.tzinfo is None:
+        last_delivered_at = last_delivered_at.replace(tzinfo=timezone.utc)
+    return last_delivered_at + delivery_interval(schedule)
+
+
+class Scheduler:
+    """Priority queue of keys by next due time (timezone-aware datetimes)."""
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int, Hashable]] = []
+        # key -> (due, sequence) of its live heap entry
+        self._current: Dict[Hashable, Tuple[datetime, int]] = {}
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._current)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._current
+
+    def schedule(self, key: Hashable, due: datetime) -> None:
+        """Schedules ``key`` at ``due``, replacing any earlier entry for it."""
+        if key in self._current and self._current[key][0] == due:
+            return
+        seq = next(self._counter)
+        self._current[key] = (due, seq)
+        heapq.heappush(self._heap, (due, seq, key))
+
+    def cancel(self, key: Hashable) -> None:
+        self._current.pop(key, None)
+
+    def keys(self) -> List[Hashable]:
+        return list(self._current)
+
+    def due(self, key: Hashable) -> Optional[datetime]:
+        """When ``key`` is next due, or None if it is not scheduled."""
+        entry = self._current.get(key)
+        return entry[0] if entry else None
+
+    def _drop_stale(self) -> None:
+        while self._heap:
+            due, seq, key = self._heap[0]
+            if self._current.get(key) == (due, seq):
+                return
+            heapq.heappop(self._heap)
+
+    def next_due(self) -> Optional[datetime]:
+        """Due time of the earliest live entry, or None if nothing is scheduled."""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> List[Hashable]:
+        """Removes and returns every key due at or before ``now``, earliest first."""
+        due = []
+        while self.next_due() is not None and self._heap[0][0] <= now:
+            _, _, key = heapq.heappop(self._heap)
+            del self._current[key]
+            due.append(key)
+        return due
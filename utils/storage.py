@@ -1,15 +1,26 @@
 import logging
-from typing import List, Dict, Any, Set
+from typing import Iterable, List, Dict, Any, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from db import get_session
-from db.models import Article
+from utils import metrics
+from db.models import Article, Source
+from sources.http import STATE_FIELDS
+from utils.polling import POLL_FIELDS
 
 logger = logging.getLogger(__name__)
 
+HASH_LOOKUP_BATCH = 500  # stays well under SQLite's bound-parameter limit
+INSERT_BATCH = 5000  # rows per executemany call
+RECENT_HASHES = 100  # newest stored hashes per source, for early-stop parsing
+
 
 def load_existing_hashes() -> Set[str]:
     """
     Loads existing article hashes from the database to prevent duplicates.
+    Reads the whole table — prefer find_existing_hashes for large databases.
     """
     session = get_session()
     try:
@@ -23,32 +34,154 @@ def load_existing_hashes() -> Set[str]:
         session.close()
 
 
-def save_articles(new_rows: List[Dict[str, Any]]) -> None:
+def existing_hashes_stmt(batch: List[str]):
+    """SELECT the stored hashes among ``batch`` (a unique-index lookup)."""
+    return select(Article.hash).where(Article.hash.in_(batch))
+
+
+def find_existing_hashes(candidates: Iterable[str]) -> Set[str]:
+    """
+    Returns the subset of candidate hashes already stored in the database.
+    Uses batched IN lookups against the unique hash index, so the cost
+    depends on the number of candidates, not the size of the table.
+    """
+    candidates = list(candidates)
+    if not candidates:
+        return set()
+
+    session = get_session()
+    found = set()
+    try:
+        for start in range(0, len(candidates), HASH_LOOKUP_BATCH):
+            batch = candidates[start : start + HASH_LOOKUP_BATCH]
+            found.update(session.scalars(existing_hashes_stmt(batch)))
+        logger.info(
+            f"Checked {len(candidates)} candidate hashes: {len(found)} already stored."
+        )
+        return found
+    except Exception as e:
+        logger.error(f"Error looking up article hashes: {e}")
+        return set()
+    finally:
+        session.close()
+
+
+def recent_hashes_stmt(source_name: str, limit: int = RECENT_HASHES):
+    """SELECT a source's newest stored hashes (walks the (source, id) index)."""
+    return (
+        select(Article.hash)
+        .where(Article.source == source_name)
+        .order_by(Article.id.desc())
+        .limit(limit)
+    )
+
+
+def load_recent_hashes(
+    source_names: Iterable[str], limit: int = RECENT_HASHES
+) -> Dict[str, Set[str]]:
+    """
+    Returns the newest ``limit`` stored hashes per source name.  Parsers use
+    them to stop reading a feed at the first article already stored.
+    """
+    session = get_session()
+    try:
+        return {
+            name: set(session.scalars(recent_hashes_stmt(name, limit)))
+            for name in set(source_names)
+        }
+    except Exception as e:
+        logger.error(f"Error loading recent article hashes: {e}")
+        return {}
+    finally:
+        session.close()
+
+
+def _article_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Maps a standard article dict onto news_articles columns."""
+    return {
+        "date_added": row.get("date_added", ""),
+        "last_modified": row.get("lastModified", ""),
+        "source": row.get("source", ""),
+        "section_name": row.get("sectionName", ""),
+        "headline": row.get("headline", ""),
+        "web_url": row.get("webUrl", ""),
+        "hash": row.get("hash", ""),
+    }
+
+
+def insert_articles(
+    session, rows: List[Dict[str, Any]], batch_size: int = INSERT_BATCH
+) -> int:
+    """
+    Inserts standard article dicts with a core INSERT ... ON CONFLICT(hash)
+    DO NOTHING in executemany batches, so articles that already exist are
+    skipped instead of failing the batch, and no ORM objects are built.
+    Returns the number inserted (caller commits).
+    """
+    stmt = sqlite_insert(Article.__table__).on_conflict_do_nothing(
+        index_elements=["hash"]
+    )
+    inserted = 0
+    for start in range(0, len(rows), batch_size):
+        batch = [_article_row(row) for row in rows[start : start + batch_size]]
+        inserted += session.execute(stmt, batch).rowcount
+    return inserted
+
+
+def save_articles(
+    new_rows: List[Dict[str, Any]], batch_size: int = INSERT_BATCH
+) -> Tuple[int, int]:
     """
-    Saves new articles to the database.
+    Saves new articles to the database through insert_articles, so articles
+    that already exist (e.g. inserted by a concurrent run) are skipped.
+    Returns (inserted, skipped); raises, after rolling back, if the insert
+    fails, so callers can tell a failure from nothing new.
     """
     if not new_rows:
         logger.info("No new rows to save.")
-        return
+        return 0, 0
 
     session = get_session()
+    inserted = 0
     try:
-        for row in new_rows:
-            article = Article(
-                date_added=row.get("date_added", ""),
-                last_modified=row.get("lastModified", ""),
-                source=row.get("source", ""),
-                section_name=row.get("sectionName", ""),
-                headline=row.get("headline", ""),
-                web_url=row.get("webUrl", ""),
-                hash=row.get("hash", ""),
-            )
-            session.add(article)
+        with metrics.DB_INSERT_SECONDS.time():
+            inserted = insert_articles(session, new_rows, batch_size)
+            session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Failed to save articles: {e}")
+        raise
+    finally:
+        session.close()
+
+    skipped = len(new_rows) - inserted
+    metrics.DB_INSERTED.inc(inserted)
+    logger.info(
+        f"Successfully saved {inserted} articles to database "
+        f"({skipped} skipped as already present)."
+    )
+    return inserted, skipped
+
+
+def save_fetch_states(states: Dict[int, Dict[str, Any]]) -> None:
+    """
+    Persists per-source fetch state (HTTP validators, cursor and polling schedule)
+    keyed by Source.id.  Fields missing from a state are left unchanged.
+    """
+    if not states:
+        return
 
+    session = get_session()
+    try:
+        for source in session.query(Source).filter(Source.id.in_(states)).all():
+            state = states[source.id]
+            for field in STATE_FIELDS + POLL_FIELDS:
+                if field in state:
+                    setattr(source, field, state[field])
         session.commit()
-        logger.info(f"Successfully saved {len(new_rows)} articles to database.")
+        logger.debug(f"Saved fetch state for {len(states)} sources.")
     except Exception as e:
         session.rollback()
-        logger.error(f"Failed to save articles: {e}")
+        logger.error(f"Failed to save fetch state: {e}")
     finally:
         session.close()